@@ -6,27 +6,16 @@ import time
 import warnings
 import logging
 
-# ── Silence all ML/tokenizer noise before importing anything heavy ──────────
+# ── Silence all ML/tokenizer noise before anything heavy is imported ────────
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 warnings.filterwarnings("ignore")
-logging.disable(logging.CRITICAL)
-
-from features.downloads import organize_downloads
-from features.projects import create_project
-from features.vault import generate_password_action
-from features.vault import scan_password_fields
-from features.vault import vault
-from features.rename import bulk_rename_action
-from features.receipts import find_receipts_action
-from core.nlu_router import route, get_model
-from core.workflow import run_workflow
-from checkpoint_manager import CheckpointManager
-from db_manager import SQLiteManager
-from session_manager import handle_resume_command
-import numpy as np
-
-# ── Re-enable logging for our own output ─────────────────────────────────────
-logging.disable(logging.NOTSET)
+
+# Feature modules, the NLU router (sentence-transformers / torch) and the
+# workflow engine are imported inside the subcommands that need them, so
+# --help, list-commands, delete and the direct feature commands start fast.
+# Subcommands that will embed text start the model loading in the
+# background before doing anything else.
+_NLU_COMMANDS = {"nl", "chat", "widget", "hotkey", None}
 
 SPINNER_PAUSED = threading.Event()
 
@@ -69,14 +58,92 @@ class Spinner:
         if final_msg:
             print(final_msg)
 
+def _ask_choice(prompt: str) -> str:
+    pause_spinner()
+    print(f"\n{prompt}")
+    try:
+        answer = input().strip()
+    except EOFError:
+        answer = "1"  # non-interactive fallback
+    resume_spinner()
+    return answer
+
+def _route_via_daemon(text: str):
+    """Route through a running nlu_daemon; None if there is none.
+
+    The daemon already holds the model, so a one-shot `nl` call needs
+    neither torch nor the intent matrix in this process.
+    """
+    import json
+    import nlu_daemon
+    from core.ctr import CTR
+    from core.session_context import get_context
+
+    try:
+        reply = nlu_daemon.request({"op": "route", "text": text,
+                                    "context": vars(get_context())})
+        if reply is None:
+            return None
+        if reply.get("ambiguous"):
+            print(reply.get("output", ""), end="")
+            answer = _ask_choice(reply["ambiguous"]["prompt"])
+            reply = nlu_daemon.request({"op": "resolve",
+                                        "id": reply["ambiguous"]["id"],
+                                        "answer": answer})
+            if reply is None:
+                return None
+    except (OSError, ValueError):
+        return None
+
+    print(reply.get("output", ""), end="")
+    if not reply.get("ok"):
+        if reply.get("type") == "ValueError":
+            raise ValueError(reply["error"])
+        raise RuntimeError(reply.get("error", "NLU daemon error"))
+    return CTR.from_json(json.dumps(reply["ctr"]))
+
+def _encode(texts):
+    """Embed *texts* through the daemon if one is running, else in-process."""
+    import numpy as np
+    import nlu_daemon
+
+    try:
+        reply = nlu_daemon.request({"op": "encode", "texts": list(texts)})
+    except (OSError, ValueError):
+        reply = None
+    if reply and reply.get("ok"):
+        return np.asarray(reply["embeddings"], dtype=np.float32)
+    from core.nlu_router import encode
+    return encode(texts)
+
+def route_with_prompt(text: str):
+    """route() for terminal front-ends: an ambiguous command is settled by
+    asking the user on stdin, then routed with their choice."""
+    ctr = _route_via_daemon(text)
+    if ctr is not None:
+        return ctr
+
+    from core.nlu_router import route, resolve_ambiguity, AmbiguousIntent
+    try:
+        return route(text)
+    except AmbiguousIntent as ambiguity:
+        answer = _ask_choice(ambiguity.prompt())
+        return resolve_ambiguity(ambiguity, ambiguity.choose(answer))
+
 def interactive_mode():
     from features.profile_manager import get_user_name
     name = get_user_name()
     print(f"\n  Hello, {name}. How can I help you today?\n")
     print("🤖 AI-OS Interactive Mode (type 'exit' to quit)\n")
 
-    from core.nlu_router import route
+    from core.model_provider import warm_up
+    warm_up()
+
+    import numpy as np
     from core.workflow import run_workflow
+    from checkpoint_manager import CheckpointManager
+    from db_manager import SQLiteManager
+    from session_manager import handle_resume_command
 
     while True:
         text = input("ai-os > ")
@@ -104,16 +171,15 @@ def interactive_mode():
         if text.lower().startswith('undo '):
             query_str = text[5:].strip()
             if query_str:
-                model = get_model()
-                query_embedding = model.encode([query_str])[0]
                 db = SQLiteManager()
                 rows = db.fetch_all("checkpoints")
                 db.close()
                 if rows:
+                    embs = _encode([query_str] + [row["command_text"] for row in rows])
+                    query_embedding = embs[0]
                     best_id = None
                     best_score = -1
-                    for row in rows:
-                        cmd_emb = model.encode([row["command_text"]])[0]
+                    for row, cmd_emb in zip(rows, embs[1:]):
                         score = float(np.dot(query_embedding, cmd_emb) / 
                                       max(np.linalg.norm(query_embedding) * np.linalg.norm(cmd_emb), 1e-9))
                         if score > best_score:
@@ -125,7 +191,7 @@ def interactive_mode():
                         continue
 
         try:
-            ctr = route(text)
+            ctr = route_with_prompt(text)
             run_workflow(ctr, dry_run=False)
         except ValueError as e:
             print(f"❌ {e}")
@@ -211,27 +277,47 @@ def main():
 
     subparsers.add_parser("widget", help="Launch desktop overlay widget")
 
+    nlu_daemon_p = subparsers.add_parser(
+        "nlu-daemon", help="Keep the NLU model warm for fast `nl` calls")
+    nlu_daemon_p.add_argument("--socket", default=None,
+                              help="Unix socket path (default: ~/.aios/nlu.sock)")
+
     args = parser.parse_args()
+
+    if args.command in _NLU_COMMANDS:
+        # A running nlu-daemon already has the model; `nl` just forwards.
+        from nlu_daemon import is_running
+        if not (args.command == "nl" and is_running()):
+            from core.model_provider import warm_up
+            warm_up()
     
     if args.command == "organize-downloads":
+        from features.downloads import organize_downloads
         organize_downloads(args.path, dry_run=not args.apply)
     elif args.command == "create-project":
+        from features.projects import create_project
         create_project(args.name, args.location, args.type, dry_run=not args.apply)
     elif args.command == "generate-password":
+        from features.vault import generate_password_action
         symbols = not args.no_symbols
         generate_password_action(args.label, args.length, 
                                uppercase=True, lowercase=True, 
                                digits=True, symbols=symbols,
                                dry_run=not args.apply)
     elif args.command == "scan-passwords":
+        from features.vault import scan_password_fields
         scan_password_fields(args.scope, dry_run=not args.apply)
     elif args.command == "autofill-app":
+        from features.vault import vault
         vault.autofill_app(args.app, dry_run=not args.apply)
     elif args.command == "autofill-config":
+        from features.vault import vault
         vault.autofill_config(args.file, dry_run=not args.apply)
     elif args.command == "bulk-rename":
+        from features.rename import bulk_rename_action
         bulk_rename_action(args.source_dir, args.pattern, args.dry_run)
     elif args.command == "find-receipts":
+        from features.receipts import find_receipts_action
         find_receipts_action(args.source_dir, args.query, args.export, args.dry_run)
     elif args.command in ("delete", "delete-command"):
         from features.command_manager import delete_user_command
@@ -245,6 +331,11 @@ def main():
     elif args.command == "nl":
         spinner = Spinner("Running")
         spinner.start()
+
+        import numpy as np
+        from core.workflow import run_workflow
+        from checkpoint_manager import CheckpointManager
+        from db_manager import SQLiteManager
         
         # --- Undo Logic ---
         text_lower = args.text.lower()
@@ -257,16 +348,15 @@ def main():
         if text_lower.startswith('undo '):
             query_str = args.text[5:].strip()
             if query_str:
-                model = get_model()
-                query_embedding = model.encode([query_str])[0]
                 db = SQLiteManager()
                 rows = db.fetch_all("checkpoints")
                 db.close()
                 if rows:
+                    embs = _encode([query_str] + [row["command_text"] for row in rows])
+                    query_embedding = embs[0]
                     best_id = None
                     best_score = -1
-                    for row in rows:
-                        cmd_emb = model.encode([row["command_text"]])[0]
+                    for row, cmd_emb in zip(rows, embs[1:]):
                         score = float(np.dot(query_embedding, cmd_emb) / 
                                       max(np.linalg.norm(query_embedding) * np.linalg.norm(cmd_emb), 1e-9))
                         if score > best_score:
@@ -278,7 +368,7 @@ def main():
                         print(cm.restore(checkpoint_id=best_id))
                         return
         try:
-            ctr = route(args.text)
+            ctr = route_with_prompt(args.text)
             spinner.stop()
             run_workflow(ctr, dry_run=False)
         except ValueError as e:
@@ -295,6 +385,9 @@ def main():
     elif args.command == "widget":
         from ui.desktop_widget import main as widget_main
         widget_main()
+    elif args.command == "nlu-daemon":
+        from nlu_daemon import run_daemon, SOCKET_PATH
+        run_daemon(args.socket or SOCKET_PATH)
     else:
         # No subcommand: drop into the interactive chat UI.
         from ui.chat import main as chat_main
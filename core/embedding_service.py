@@ -0,0 +1,202 @@
+"""
+core/embedding_service.py
+
+In-process micro-batching front for the sentence encoder.
+
+The tray, desktop widget and TUI each handle a command on its own thread.
+When several of them embed text at once, every call used to run the model
+with a batch of one, and the calls contended for the GIL and the torch
+thread pool.  EmbeddingService puts a single worker thread in front of the
+model.  Callers enqueue texts and get a Future back.  The worker collects
+the requests that arrive within a short window, encodes their distinct
+texts in one model call and hands each caller its own rows.
+
+A lone request pays at most the window (a few milliseconds).  Under load
+the window fills while the previous batch is still encoding, so the batch
+grows instead of the queue.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+
+import numpy as np
+
+
+class EmbeddingService:
+    """Coalesces concurrent encode calls into micro-batches.
+
+    Args:
+        encode_fn:  Called with a list of distinct texts; returns (N, D).
+        window:     Seconds to wait for more requests after the first one.
+        max_batch:  Stop collecting once this many texts are pending.
+    """
+
+    def __init__(self, encode_fn: Callable[[List[str]], np.ndarray],
+                 window: float = 0.003, max_batch: int = 64) -> None:
+        self.encode_fn = encode_fn
+        self.window = window
+        self.max_batch = max_batch
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.texts = 0
+
+    def submit(self, texts: List[str]) -> Future:
+        """Queue *texts*; the Future resolves to their (len(texts), D) embeddings."""
+        future: Future = Future()
+        texts = list(texts)
+        if not texts:
+            future.set_result(np.zeros((0, 0), dtype=np.float32))
+            return future
+        self._ensure_worker()
+        self._queue.put((texts, future))
+        return future
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Blocking form of submit()."""
+        return self.submit(texts).result()
+
+    def _ensure_worker(self) -> None:
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._run, name="embedding-service", daemon=True)
+                self._worker.start()
+
+    def _collect(self) -> List[tuple]:
+        """Block for one request, then gather more until the window closes."""
+        pending = [self._queue.get()]
+        size = len(pending[0][0])
+        deadline = time.monotonic() + self.window
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = (self._queue.get(timeout=remaining) if remaining > 0
+                        else self._queue.get_nowait())
+            except queue.Empty:
+                break
+            pending.append(item)
+            size += len(item[0])
+        return pending
+
+    def _run(self) -> None:
+        while True:
+            pending = self._collect()
+            unique = list(dict.fromkeys(t for texts, _ in pending for t in texts))
+            try:
+                vectors = np.asarray(self.encode_fn(unique), dtype=np.float32)
+            except BaseException as exc:
+                for _, future in pending:
+                    future.set_exception(exc)
+                continue
+            row = {t: i for i, t in enumerate(unique)}
+            for texts, future in pending:
+                future.set_result(vectors[[row[t] for t in texts]])
+            with self._lock:
+                self.requests += len(pending)
+                self.batches += 1
+                self.texts += len(unique)
+
+    def stats(self) -> dict:
+        """Return request/batch counters and the mean texts per model call."""
+        with self._lock:
+            return {
+                "requests":   self.requests,
+                "batches":    self.batches,
+                "texts":      self.texts,
+                "mean_batch": self.texts / self.batches if self.batches else 0.0,
+            }
+
+
+# ----------------------------------------------------------------------
+# Demo  (required by project rules: every module must expose run_demo())
+# ----------------------------------------------------------------------
+
+def _slow_encode(texts: List[str]) -> np.ndarray:
+    """Stand-in model: fixed 20 ms per call plus 1 ms per text."""
+    time.sleep(0.02 + 0.001 * len(texts))
+    return np.array([[len(t), sum(map(ord, t)) % 97] for t in texts], dtype=np.float32)
+
+
+def run_demo() -> None:
+    """Eight threads embedding at once: direct calls vs the service."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    print("=== Embedding Service Demo ===\n")
+    commands = [f"command number {i}" for i in range(8)]
+    model_lock = threading.Lock()   # one model, one call at a time
+
+    def direct(text):
+        with model_lock:
+            return _slow_encode([text])
+
+    service = EmbeddingService(_slow_encode)
+    for label, fn in [("direct", direct), ("service", lambda t: service.encode([t]))]:
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(fn, commands))
+        print(f"{label:<8} {(time.perf_counter() - t0) * 1000:6.1f} ms")
+    print(f"\nService stats: {service.stats()}")
+    print("\n=== Demo complete ===")
+
+
+# ----------------------------------------------------------------------
+# Tests
+# ----------------------------------------------------------------------
+
+def _run_tests() -> None:
+    """Self-contained test cases for EmbeddingService."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    print("\n=== Running Tests ===\n")
+
+    # Test 1: every caller gets its own rows, in order
+    print("Test 1: results match a direct encode")
+    service = EmbeddingService(_slow_encode)
+    out = service.encode(["b", "a", "b"])
+    assert np.array_equal(out, _slow_encode(["b", "a", "b"]))
+    assert service.encode([]).shape == (0, 0)
+    print("  PASSED\n")
+
+    # Test 2: concurrent requests share model calls
+    print("Test 2: concurrent requests are coalesced")
+    calls = []
+    service = EmbeddingService(lambda texts: calls.append(len(texts)) or _slow_encode(texts),
+                               window=0.05)
+    texts = [f"t{i}" for i in range(16)]
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(lambda t: service.encode([t, "shared"]), texts))
+    for t, res in zip(texts, results):
+        assert np.array_equal(res, _slow_encode([t, "shared"]))
+    assert len(calls) < len(texts), calls
+    assert service.stats()["requests"] == len(texts)
+    print("  PASSED\n")
+
+    # Test 3: a failing model call fails every request in that batch
+    print("Test 3: errors propagate to callers")
+
+    def _broken(texts):
+        raise RuntimeError("model unavailable")
+
+    service = EmbeddingService(_broken)
+    try:
+        service.encode(["x"])
+    except RuntimeError as exc:
+        assert "unavailable" in str(exc)
+    else:
+        raise AssertionError("expected RuntimeError")
+    print("  PASSED\n")
+
+    print("=== All Tests Passed ===")
+
+
+if __name__ == "__main__":
+    run_demo()
+    _run_tests()
@@ -0,0 +1,210 @@
+"""
+core/embedding_store.py
+
+Query embedding cache shared by the NLU pipeline.
+
+QueryCache — bounded in-memory LRU of query text → embedding with hit/miss
+counters, optionally saving its hottest entries to disk at exit.  Intent
+example embeddings are persisted separately by core/vector_store.py.
+
+Only numpy and the Python standard library are used.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+
+# ---------------------------------------------------------------------------
+# QueryCache
+# ---------------------------------------------------------------------------
+
+class QueryCache:
+    """Thread-safe LRU of text → embedding placed in front of model.encode.
+
+    Args:
+        maxsize:      Maximum number of cached texts.
+        persist_path: Optional .npz file; when set, load() restores entries
+                      from it and save() writes the most recently used ones.
+    """
+
+    def __init__(self, maxsize: int = 1024, persist_path: Optional[Path] = None) -> None:
+        self.maxsize = maxsize
+        self.persist_path = Path(persist_path) if persist_path else None
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def encode(self, texts: List[str], encode_fn: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """Return embeddings for *texts*, calling *encode_fn* once for all misses."""
+        texts = list(texts)
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for t in texts:
+                vec = self._entries.get(t)
+                if vec is not None:
+                    self._entries.move_to_end(t)
+                    found[t] = vec
+            missing = list(dict.fromkeys(t for t in texts if t not in found))
+            self.hits += sum(1 for t in texts if t in found)
+            self.misses += len(missing)
+
+        if missing:
+            new_vecs = np.asarray(encode_fn(missing), dtype=np.float32)
+            with self._lock:
+                for t, vec in zip(missing, new_vecs):
+                    vec.setflags(write=False)
+                    found[t] = vec
+                    self._entries[t] = vec
+                    self._entries.move_to_end(t)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack([found[t] for t in texts])
+
+    def stats(self) -> dict:
+        """Return size and hit/miss counters."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size":     len(self._entries),
+                "maxsize":  self.maxsize,
+                "hits":     self.hits,
+                "misses":   self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def load(self) -> int:
+        """Restore persisted entries; returns how many were loaded."""
+        if self.persist_path is None:
+            return 0
+        try:
+            with np.load(self.persist_path, allow_pickle=False) as data:
+                texts, vectors = list(data["texts"]), data["vectors"]
+        except (OSError, ValueError, KeyError):
+            return 0
+        with self._lock:
+            for t, vec in zip(texts, vectors):
+                if t not in self._entries:
+                    vec = np.array(vec, dtype=np.float32)
+                    vec.setflags(write=False)
+                    self._entries[str(t)] = vec
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return len(texts)
+
+    def save(self, limit: int = 256) -> None:
+        """Persist the *limit* most recently used entries."""
+        if self.persist_path is None:
+            return
+        with self._lock:
+            hot = list(self._entries.items())[-limit:]
+        if not hot:
+            return
+        try:
+            self.persist_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.persist_path.with_suffix(".tmp")
+            with open(tmp, "wb") as fh:
+                np.savez(fh,
+                         texts=np.array([t for t, _ in hot]),
+                         vectors=np.stack([v for _, v in hot]))
+            os.replace(tmp, self.persist_path)
+        except OSError as exc:
+            print(f"[EMBED] Warning: could not persist query cache: {exc}")
+
+
+# ----------------------------------------------------------------------
+# Demo  (required by project rules: every module must expose run_demo())
+# ----------------------------------------------------------------------
+
+def _fake_encode(phrases: List[str]) -> np.ndarray:
+    """Deterministic 8-d stand-in for SentenceTransformer.encode."""
+    rows = []
+    for p in phrases:
+        seed = int(hashlib.md5(p.encode("utf-8")).hexdigest()[:8], 16)
+        v = np.random.default_rng(seed).standard_normal(8).astype(np.float32)
+        rows.append(v / np.linalg.norm(v))
+    return np.stack(rows)
+
+
+def run_demo() -> None:
+    """Show cache hits, misses and LRU eviction."""
+    print("=== QueryCache Demo ===\n")
+    calls: List[List[str]] = []
+
+    def encode(batch):
+        calls.append(list(batch))
+        return _fake_encode(batch)
+
+    cache = QueryCache(maxsize=2)
+    for text in ["autofill spotify", "autofill spotify", "find receipt", "clean downloads"]:
+        cache.encode([text], encode)
+    print(f"Encoded: {calls}")
+    print(f"Query cache: {cache.stats()}")
+    print("\n=== Demo complete ===")
+
+
+# ----------------------------------------------------------------------
+# Test cases  (required by project rules: 3 test cases per module)
+# ----------------------------------------------------------------------
+
+def _run_tests() -> None:
+    """Self-contained test cases for QueryCache."""
+    import tempfile
+
+    print("\n=== Running Tests ===\n")
+
+    def _must_not_encode(batch):
+        raise AssertionError(f"unexpected encode of {batch}")
+
+    # Test 1: QueryCache evicts least recently used entries and round-trips
+    print("Test 1: QueryCache LRU eviction and persistence")
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = QueryCache(maxsize=2, persist_path=Path(tmp) / "q.npz")
+        cache.encode(["a", "b"], _fake_encode)
+        cache.encode(["a", "c"], _fake_encode)          # evicts "b"
+        assert cache.stats()["hits"] == 1 and cache.stats()["size"] == 2
+        cache.save()
+        restored = QueryCache(maxsize=2, persist_path=Path(tmp) / "q.npz")
+        assert restored.load() == 2
+        restored.encode(["a", "c"], _must_not_encode)
+        assert restored.stats()["hits"] == 2
+    print("  PASSED\n")
+
+    # Test 2: repeated texts in one call are encoded once
+    print("Test 2: QueryCache deduplicates misses")
+    calls = []
+    cache = QueryCache(maxsize=4)
+    out = cache.encode(["x", "y", "x"], lambda b: calls.append(list(b)) or _fake_encode(b))
+    assert calls == [["x", "y"]] and out.shape == (3, 8)
+    assert np.array_equal(out[0], out[2])
+    print("  PASSED\n")
+
+    # Test 3: a missing or corrupt persist file is ignored
+    print("Test 3: QueryCache load tolerates a bad file")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "q.npz"
+        assert QueryCache(persist_path=path).load() == 0
+        path.write_bytes(b"not an npz")
+        assert QueryCache(persist_path=path).load() == 0
+    print("  PASSED\n")
+
+    print("=== All Tests Passed ===")
+
+
+if __name__ == "__main__":
+    run_demo()
+    _run_tests()
@@ -0,0 +1,162 @@
+"""
+core/keyword_matcher.py
+
+Aho-Corasick multi-keyword matcher.
+
+Many routing decisions reduce to "does the utterance contain any of these
+words".  Checking each list with ``any(w in text for w in words)`` rescans
+the text once per keyword.  KeywordMatcher compiles every keyword list,
+tagged with a group name, into one automaton at import.  A single pass
+over the text then reports every occurrence of every keyword.
+
+Matching is case-insensitive substring matching, the same semantics as
+``w in text.lower()``.
+"""
+
+from collections import deque
+from typing import Dict, Iterable, List, NamedTuple
+
+
+class KeywordHit(NamedTuple):
+    start: int
+    end: int
+    keyword: str
+    group: str
+
+
+class KeywordMatcher:
+    """Finds all occurrences of grouped keywords in one scan.
+
+    Args:
+        groups: Mapping of group name → keywords.  A keyword may appear in
+                several groups and is then reported once per group.
+    """
+
+    def __init__(self, groups: Dict[str, Iterable[str]]) -> None:
+        self.groups = {name: [w.lower() for w in words] for name, words in groups.items()}
+        # State 0 is the root; each state has transitions, a failure link
+        # and the (keyword, group) pairs that end there.
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[tuple]] = [[]]
+
+        for group, words in self.groups.items():
+            for word in words:
+                if word:
+                    self._insert(word, group)
+        self._link()
+
+    def _insert(self, word: str, group: str) -> None:
+        state = 0
+        for ch in word:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        if (word, group) not in self._out[state]:
+            self._out[state].append((word, group))
+
+    def _link(self) -> None:
+        """Breadth-first construction of failure links."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find_all(self, text: str) -> List[KeywordHit]:
+        """Return every keyword occurrence in *text*, ordered by end position.
+
+        Spans index into ``text.lower()``.
+        """
+        hits = []
+        state = 0
+        for i, ch in enumerate(text.lower()):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            for word, group in self._out[state]:
+                hits.append(KeywordHit(i + 1 - len(word), i + 1, word, group))
+        return hits
+
+    def matches(self, text: str) -> Dict[str, List[str]]:
+        """Return group → distinct keywords found in *text*, in keyword-list order.
+
+        The order follows each group's keyword list, not the position in the
+        text, so callers that pick "the first listed keyword present" can
+        take element 0.
+        """
+        found: Dict[str, set] = {}
+        for hit in self.find_all(text):
+            found.setdefault(hit.group, set()).add(hit.keyword)
+        return {
+            group: [w for w in self.groups[group] if w in words]
+            for group, words in found.items()
+        }
+
+
+# ----------------------------------------------------------------------
+# Demo  (required by project rules: every module must expose run_demo())
+# ----------------------------------------------------------------------
+
+def run_demo() -> None:
+    """Match a calendar-style utterance against several word groups."""
+    print("=== Keyword Matcher Demo ===\n")
+    matcher = KeywordMatcher({
+        "delete": ["delete", "cancel", "remove"],
+        "list": ["what", "show", "do i have"],
+        "date": ["tomorrow", "today", "friday"],
+    })
+    text = "What do I have on Friday? Cancel tomorrow's standup"
+    print(f"Text: {text!r}\n")
+    for hit in matcher.find_all(text):
+        print(f"  {hit.group:<7} {hit.keyword!r:<12} [{hit.start}:{hit.end}]")
+    print(f"\nmatches(): {matcher.matches(text)}")
+    print("\n=== Demo complete ===")
+
+
+# ----------------------------------------------------------------------
+# Tests
+# ----------------------------------------------------------------------
+
+def _run_tests() -> None:
+    """Self-contained test cases for KeywordMatcher."""
+    print("\n=== Running Tests ===\n")
+
+    # Test 1: agrees with the naive substring check
+    print("Test 1: same answers as `w in text.lower()`")
+    words = ["he", "she", "his", "hers", "mail", "email", "it", "do i have"]
+    matcher = KeywordMatcher({"w": words})
+    for text in ["ushers", "Email it", "What DO I HAVE", "nothing", "shis"]:
+        expected = [w for w in words if w in text.lower()]
+        assert matcher.matches(text).get("w", []) == expected, (text, expected)
+    print("  PASSED\n")
+
+    # Test 2: overlapping hits report exact spans
+    print("Test 2: overlapping spans")
+    hits = KeywordMatcher({"w": ["he", "she", "hers"]}).find_all("ushers")
+    assert sorted((h.start, h.end, h.keyword) for h in hits) == \
+        [(1, 4, "she"), (2, 4, "he"), (2, 6, "hers")]
+    print("  PASSED\n")
+
+    # Test 3: a keyword shared by two groups is reported for both
+    print("Test 3: shared keyword in two groups")
+    found = KeywordMatcher({"a": ["schedule"], "b": ["schedule", "x"]}).matches("Schedule it")
+    assert found == {"a": ["schedule"], "b": ["schedule"]}
+    print("  PASSED\n")
+
+    print("=== All Tests Passed ===")
+
+
+if __name__ == "__main__":
+    run_demo()
+    _run_tests()
@@ -1,24 +1,41 @@
 import os
 import json
+import asyncio
+import hashlib
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 load_dotenv()
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
+# Overridable so tests can point the planner at a local stub server.
+GEMINI_API_BASE = os.environ.get(
+    "GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1beta"
+)
 
-try:
-    from google import genai
-    _HAS_GENAI = True
-except ImportError:
-    _HAS_GENAI = False
-
-if GEMINI_API_KEY and _HAS_GENAI:
-    client = genai.Client()
+if GEMINI_API_KEY:
     # User's hard override: always default to 3.1 flash lite for this project.
     MODEL_NAME = "gemini-3.1-flash-lite-preview"
 else:
-    client = None
     MODEL_NAME = None
     print("[LLM] Warning: GEMINI_API_KEY not set. LLM fallback disabled.")
+FALLBACK_MODEL_NAME = "gemini-2.5-flash"
+
+# One budget for the whole call, both models included.
+LLM_DEADLINE = float(os.environ.get("AIOS_LLM_DEADLINE", "12"))
+# The fallback model starts when the primary fails or has not answered
+# within this many seconds, whichever comes first.
+LLM_HEDGE_DELAY = float(os.environ.get("AIOS_LLM_HEDGE_DELAY", "2.5"))
+PLAN_CACHE_MAX_AGE_HOURS = 24 * 7
+
+# HTTP calls block, so they run here rather than on the event loop.  A
+# private pool keeps a losing request from delaying interpreter shutdown
+# in asyncio.run(), which waits for the default executor.
+_HTTP_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="llm-http")
+
+# None means db_manager's default database; the tests use a scratch file.
+_PLAN_CACHE_DB = None
 
 PLAN_PROMPT = """You are a shell command planner for a personal Ubuntu 22.04 system. The user has requested: {user_request}
 
@@ -46,105 +63,231 @@ All file paths must be within the user home directory.
 If the request requires sudo or kernel access, still include the command but mark it as critical with a clear risk_reason.
 For package removal, prefer: apt-get remove -y <package> run via the override mechanism rather than generating sudo directly. Always include -y flag for apt commands to prevent interactive prompts."""
 
-def generate_plan(user_request: str) -> dict:
-    """
-    Calls Gemini API and returns a parsed dict matching the SHELL_PLAN CTR params structure.
-    Raises RuntimeError if API key is not set.
-    Raises ValueError if response cannot be parsed as valid JSON.
-    Raises RuntimeError if API call fails for any reason.
-    """
-    if client is None:
-        raise RuntimeError("[LLM] Gemini API key not configured. Set GEMINI_API_KEY in .env file.")
-    
-    prompt = PLAN_PROMPT.format(user_request=user_request)
-    
+# Cached plans are dropped whenever the prompt text changes.
+_PROMPT_VERSION = hashlib.sha1(PLAN_PROMPT.encode("utf-8")).hexdigest()[:12]
+# Bumped when the key format changes (2: request case is preserved).
+_PLAN_KEY_FORMAT = 2
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Transport
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _call_model(model: str, prompt: str, timeout: float) -> str:
+    """POST *prompt* to one Gemini model and return the response text."""
+    body = json.dumps({"contents": [{"parts": [{"text": prompt}]}]}).encode("utf-8")
+    req = urllib.request.Request(
+        f"{GEMINI_API_BASE}/models/{model}:generateContent",
+        data=body,
+        headers={"Content-Type": "application/json", "x-goog-api-key": GEMINI_API_KEY or ""},
+        method="POST",
+    )
     try:
-        response = client.models.generate_content(
-            model=MODEL_NAME,
-            contents=prompt,
-        )
-        raw = response.text.strip()
-    except Exception as e:
-        print(f"[LLM] Main model ({MODEL_NAME}) failed with error: {e}. Switching to fallback model.")
-        try:
-            response = client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=prompt,
-            )
-            raw = response.text.strip()
-        except Exception as fallback_e:
-            raise RuntimeError(f"API call to both models failed. Fallback error: {fallback_e}")
-    
-    # Strip markdown code fences if present
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            payload = json.loads(resp.read().decode("utf-8"))
+    except urllib.error.HTTPError as e:
+        raise RuntimeError(f"HTTP {e.code} from {model}") from e
+    try:
+        parts = payload["candidates"][0]["content"]["parts"]
+    except (KeyError, IndexError, TypeError):
+        raise RuntimeError(f"{model} returned no candidates")
+    return "".join(part.get("text", "") for part in parts).strip()
+
+
+def _strip_fences(raw: str) -> str:
+    """Strip markdown code fences if present."""
+    raw = raw.strip()
     if raw.startswith("```json"):
         raw = raw[7:]
     elif raw.startswith("```"):
         raw = raw[3:]
     if raw.endswith("```"):
         raw = raw[:-3]
-    raw = raw.strip()
-    
+    return raw.strip()
+
+
+async def _race(prompt: str, parse, deadline: float = None,
+                hedge_delay: float = None) -> tuple:
+    """
+    Ask the primary model, hedged by the fallback model, and return
+    (parse(response), model) for the first response that parses.
+
+    The fallback starts after *hedge_delay* seconds or as soon as the
+    primary fails.  Both share *deadline*: no HTTP timeout outlives it.
+    Raises ValueError if every answer was unparseable, RuntimeError if a
+    call failed or the deadline passed.
+    """
+    deadline = LLM_DEADLINE if deadline is None else deadline
+    hedge_delay = LLM_HEDGE_DELAY if hedge_delay is None else hedge_delay
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    waiting = [MODEL_NAME, FALLBACK_MODEL_NAME]
+    running = {}
+    errors = []
+
+    def launch():
+        model = waiting.pop(0)
+        timeout = max(0.1, started + deadline - loop.time())
+        running[loop.run_in_executor(
+            _HTTP_POOL, lambda: parse(_call_model(model, prompt, timeout)))] = model
+
+    launch()
+    while running:
+        remaining = started + deadline - loop.time()
+        if remaining <= 0:
+            break
+        wait = remaining
+        if waiting:
+            wait = min(wait, max(0.0, started + hedge_delay - loop.time()))
+        done, _ = await asyncio.wait(running, timeout=wait,
+                                     return_when=asyncio.FIRST_COMPLETED)
+        for future in done:
+            model = running.pop(future)
+            try:
+                return future.result(), model
+            except Exception as e:
+                errors.append(e)
+                print(f"[LLM] {model} failed with error: {e}")
+        if waiting and (not running or loop.time() >= started + hedge_delay):
+            launch()
+
+    if running:
+        errors.append(TimeoutError(f"no answer within {deadline:g}s"))
+    if errors and all(isinstance(e, ValueError) for e in errors):
+        raise errors[-1]
+    raise RuntimeError(f"API call to both models failed. Last error: {errors[-1]}")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Plans
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _parse_plan(raw: str) -> dict:
+    """Parse and validate a plan response; raises ValueError."""
+    raw = _strip_fences(raw)
     try:
         parsed = json.loads(raw)
     except json.JSONDecodeError:
         raise ValueError(f"[LLM] Could not parse Gemini response as JSON. Raw response: {raw[:200]}")
-    
+
     required_keys = {"intent_description", "commands", "saveable"}
     if not isinstance(parsed, dict) or not required_keys.issubset(parsed.keys()):
         raise ValueError("[LLM] Gemini response missing required fields.")
-    
+
     if not isinstance(parsed.get("commands"), list) or len(parsed["commands"]) == 0:
-        raise ValueError("[LLM] Command item missing required fields.") # Actually user text said "commands is a non-empty list" but exception is generic
-        
+        raise ValueError("[LLM] Command item missing required fields.")
+
     for item in parsed["commands"]:
         item_req = {"cmd", "explanation", "risk_level"}
         if not isinstance(item, dict) or not item_req.issubset(item.keys()):
             raise ValueError("[LLM] Command item missing required fields.")
-            
+
     return parsed
 
+
+def _plan_key(user_request: str) -> str:
+    """Cache key: prompt version plus whitespace-collapsed text.
+
+    Case is kept: "rename Report.PDF" and "rename report.pdf" name
+    different files and must not share a plan.
+    """
+    return f"{_PROMPT_VERSION}.{_PLAN_KEY_FORMAT}:{' '.join(user_request.split())}"
+
+
+def _plan_db():
+    from db_manager import SQLiteManager
+    return SQLiteManager() if _PLAN_CACHE_DB is None else SQLiteManager(db_path=_PLAN_CACHE_DB)
+
+
+def _cached_plan(user_request: str) -> dict | None:
+    try:
+        with _plan_db() as db:
+            raw = db.get_cached_plan(_plan_key(user_request), PLAN_CACHE_MAX_AGE_HOURS)
+    except Exception as e:
+        print(f"[LLM] Plan cache unavailable: {e}")
+        return None
+    return json.loads(raw) if raw else None
+
+
+def _store_plan(user_request: str, plan: dict, model: str) -> None:
+    try:
+        with _plan_db() as db:
+            db.put_cached_plan(_plan_key(user_request), json.dumps(plan), model)
+    except Exception as e:
+        print(f"[LLM] Could not cache plan: {e}")
+
+
+async def generate_plan_async(user_request: str, use_cache: bool = True) -> dict:
+    """
+    Async form of generate_plan().  Answers from the plan cache when it
+    can; otherwise races the primary and fallback models under one
+    deadline and caches the winning plan.
+    """
+    if use_cache:
+        cached = _cached_plan(user_request)
+        if cached is not None:
+            return cached
+
+    if MODEL_NAME is None:
+        raise RuntimeError("[LLM] Gemini API key not configured. Set GEMINI_API_KEY in .env file.")
+
+    prompt = PLAN_PROMPT.format(user_request=user_request)
+    plan, model = await _race(prompt, _parse_plan)
+    if use_cache:
+        _store_plan(user_request, plan, model)
+    return plan
+
+
+def generate_plan(user_request: str, use_cache: bool = True) -> dict:
+    """
+    Calls Gemini API and returns a parsed dict matching the SHELL_PLAN CTR params structure.
+    Repeated requests (same text up to spacing) come from the plan cache.
+    Safe to call from a thread that is already running an event loop.
+    Raises RuntimeError if API key is not set.
+    Raises ValueError if response cannot be parsed as valid JSON.
+    Raises RuntimeError if API call fails for any reason or the deadline passes.
+    """
+    return _run_sync(generate_plan_async(user_request, use_cache))
+
+
+def _run_sync(coro):
+    """Run *coro* to completion from synchronous code.
+
+    asyncio.run() refuses to start inside a running loop (Textual workers,
+    the daemon), so there the coroutine gets a loop on a helper thread.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="llm-sync") as pool:
+        return pool.submit(asyncio.run, coro).result()
+
+
+def _parse_paraphrases(raw: str) -> list[str]:
+    parsed = json.loads(_strip_fences(raw))
+    if isinstance(parsed, list) and len(parsed) >= 1 and all(isinstance(x, str) for x in parsed):
+        return parsed
+    raise ValueError("[LLM] Paraphrase response is not a list of strings.")
+
+
 def generate_paraphrases(trigger_phrase: str) -> list[str]:
     """
     Given a trigger phrase like "install tree", returns a list of 8 semantically equivalent phrases for use as intent examples in the sentence transformer.
     """
-    if client is None:
+    if MODEL_NAME is None:
         return [trigger_phrase]
-        
+
     prompt = f"""Generate exactly 8 different ways a user might phrase this command request: "{trigger_phrase}"
 Return a JSON array of 8 strings only. No other text, no markdown, no explanation.
 Example format: ["phrase 1", "phrase 2", ..., "phrase 8"]
 The phrases should vary in vocabulary and structure but all mean the same thing."""
 
     try:
-        try:
-            response = client.models.generate_content(
-                model=MODEL_NAME,
-                contents=prompt,
-            )
-        except Exception as e:
-            print(f"[LLM] Main model ({MODEL_NAME}) failed for paraphrasing. Switching to fallback.")
-            response = client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=prompt,
-            )
-        raw = response.text.strip()
-        
-        # Strip markdown fences
-        if raw.startswith("```json"):
-            raw = raw[7:]
-        elif raw.startswith("```"):
-            raw = raw[3:]
-        if raw.endswith("```"):
-            raw = raw[:-3]
-        raw = raw.strip()
-        
-        parsed = json.loads(raw)
-        if isinstance(parsed, list) and len(parsed) >= 1 and all(isinstance(x, str) for x in parsed):
-            return parsed
+        phrases, _ = _run_sync(_race(prompt, _parse_paraphrases))
+        return phrases
     except Exception:
-        pass
-        
-    return [trigger_phrase]
+        return [trigger_phrase]
 
 def run_demo():
     if GEMINI_API_KEY:
@@ -166,5 +309,159 @@ def run_demo():
     else:
         print("Set GEMINI_API_KEY in .env to test")
 
+# ─────────────────────────────────────────────────────────────────────────────
+# Tests
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _stub_server(behaviour: dict):
+    """
+    Start a local Gemini stand-in on a free port.  *behaviour* maps model
+    name → (delay_seconds, status, text).  Returns (server, hits).
+    """
+    import re
+    import threading
+    import time
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            model = re.search(r"/models/([^:]+):", self.path).group(1)
+            hits.append(model)
+            delay, status, text = behaviour[model]
+            time.sleep(delay)
+            body = json.dumps({"candidates": [{"content": {"parts": [{"text": text}]}}]})
+            try:
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(body.encode("utf-8"))
+            except OSError:
+                pass   # the client gave up first
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, hits
+
+
+def _run_tests() -> None:
+    """Self-contained test cases against a local stub server."""
+    import tempfile
+    import time
+
+    global GEMINI_API_BASE, MODEL_NAME, LLM_DEADLINE, LLM_HEDGE_DELAY, _PLAN_CACHE_DB
+    saved = (GEMINI_API_BASE, MODEL_NAME, LLM_DEADLINE, LLM_HEDGE_DELAY, _PLAN_CACHE_DB)
+    plan = {"intent_description": "list files", "saveable": True,
+            "commands": [{"cmd": "ls", "explanation": "list", "risk_level": "low"}]}
+    good = "```json\n" + json.dumps(plan) + "\n```"
+
+    print("\n=== Running Tests ===\n")
+    tmp = tempfile.TemporaryDirectory()
+    try:
+        MODEL_NAME = "primary"
+        LLM_DEADLINE, LLM_HEDGE_DELAY = 2.0, 0.2
+        _PLAN_CACHE_DB = os.path.join(tmp.name, "plans.db")
+
+        # Test 1: a stalled primary is overtaken by the hedged fallback
+        print("Test 1: fallback wins the race against a slow primary")
+        server, hits = _stub_server({"primary": (1.5, 200, good),
+                                     FALLBACK_MODEL_NAME: (0.0, 200, good)})
+        GEMINI_API_BASE = f"http://127.0.0.1:{server.server_port}"
+        t0 = time.perf_counter()
+        assert generate_plan("List   my files") == plan
+        assert time.perf_counter() - t0 < 1.0
+        assert hits == ["primary", FALLBACK_MODEL_NAME]
+        print("  PASSED\n")
+
+        # Test 2: the same request, up to spacing, is served from cache
+        print("Test 2: repeated request comes from the plan cache")
+        t0 = time.perf_counter()
+        assert generate_plan(" List my  files ") == plan
+        assert time.perf_counter() - t0 < 0.2
+        assert len(hits) == 2
+        assert _plan_key("rename Report.PDF") != _plan_key("rename report.pdf")
+        assert _cached_plan("list my FILES") is None
+        server.shutdown()
+        print("  PASSED\n")
+
+        # Test 3: a failing primary starts the fallback at once
+        print("Test 3: primary error falls through without waiting for the hedge")
+        LLM_HEDGE_DELAY = 1.0
+        server, hits = _stub_server({"primary": (0.0, 500, ""),
+                                     FALLBACK_MODEL_NAME: (0.0, 200, good)})
+        GEMINI_API_BASE = f"http://127.0.0.1:{server.server_port}"
+        t0 = time.perf_counter()
+        assert generate_plan("show disk usage", use_cache=False) == plan
+        assert time.perf_counter() - t0 < 0.8
+        server.shutdown()
+        print("  PASSED\n")
+
+        # Test 4: both models too slow → RuntimeError at the deadline
+        print("Test 4: one deadline covers both models")
+        LLM_DEADLINE, LLM_HEDGE_DELAY = 0.5, 0.1
+        server, _ = _stub_server({"primary": (2.0, 200, good),
+                                  FALLBACK_MODEL_NAME: (2.0, 200, good)})
+        GEMINI_API_BASE = f"http://127.0.0.1:{server.server_port}"
+        t0 = time.perf_counter()
+        try:
+            generate_plan("check battery", use_cache=False)
+            raise AssertionError("expected RuntimeError")
+        except RuntimeError:
+            pass
+        assert time.perf_counter() - t0 < 1.0
+        server.shutdown()
+        print("  PASSED\n")
+
+        # Test 5: unparseable answers from both models → ValueError, nothing cached
+        print("Test 5: invalid plans raise ValueError")
+        LLM_DEADLINE = 2.0
+        server, _ = _stub_server({"primary": (0.0, 200, "not json"),
+                                  FALLBACK_MODEL_NAME: (0.0, 200, '{"commands": []}')})
+        GEMINI_API_BASE = f"http://127.0.0.1:{server.server_port}"
+        try:
+            generate_plan("free some space")
+            raise AssertionError("expected ValueError")
+        except ValueError:
+            pass
+        assert _cached_plan("free some space") is None
+        server.shutdown()
+        print("  PASSED\n")
+
+        # Test 6: the sync API works inside a running event loop
+        print("Test 6: generate_plan / generate_paraphrases under a running loop")
+        phrases = json.dumps(["show uptime", "how long has it been up"])
+        server, _ = _stub_server({"primary": (0.0, 200, good),
+                                  FALLBACK_MODEL_NAME: (0.0, 200, phrases)})
+        GEMINI_API_BASE = f"http://127.0.0.1:{server.server_port}"
+
+        async def _from_loop():
+            return generate_plan("show uptime", use_cache=False)
+
+        assert asyncio.run(_from_loop()) == plan
+        server.shutdown()
+        server, _ = _stub_server({"primary": (0.0, 200, phrases),
+                                  FALLBACK_MODEL_NAME: (0.0, 200, phrases)})
+        GEMINI_API_BASE = f"http://127.0.0.1:{server.server_port}"
+
+        async def _paraphrase_from_loop():
+            return generate_paraphrases("show uptime")
+
+        assert asyncio.run(_paraphrase_from_loop()) == json.loads(phrases)
+        server.shutdown()
+        print("  PASSED\n")
+    finally:
+        GEMINI_API_BASE, MODEL_NAME, LLM_DEADLINE, LLM_HEDGE_DELAY, _PLAN_CACHE_DB = saved
+        tmp.cleanup()
+
+    print("=== All Tests Passed ===")
+
+
 if __name__ == "__main__":
     run_demo()
+    _run_tests()
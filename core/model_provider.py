@@ -0,0 +1,355 @@
+"""
+core/model_provider.py
+
+Single owner of the sentence embedding model for the whole process.
+
+The model is loaded only when first needed, so CLI subcommands that never
+embed text start without torch.  warm_up() begins loading on a daemon thread
+as soon as a front-end starts, and every consumer — router, receipts,
+semantic organizer, semantic undo — shares the one instance through
+get_model() / encode().
+
+Encoder backends (AIOS_ENCODER_BACKEND):
+  torch      — sentence-transformers on PyTorch (default)
+  onnx       — the same MiniLM graph on ONNX Runtime, no torch at run time
+  onnx-int8  — ONNX Runtime with dynamically quantised int8 weights
+
+The ONNX graphs are exported from the sentence-transformers checkpoint once
+(this step needs torch) into ~/.aios/models/ and reused afterwards.  The fp32
+graph reproduces the torch embeddings, so it shares their example cache; the
+int8 graph stays within ~1% cosine of them, which keeps stored corrections
+usable, but gets its own cache namespace (ENCODER_ID).
+"""
+
+import atexit
+import inspect
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import List, Optional, Union
+
+import numpy as np
+
+from core.embedding_service import EmbeddingService
+from core.embedding_store import QueryCache
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+_BACKENDS = ("torch", "onnx", "onnx-int8")
+ENCODER_BACKEND = os.environ.get("AIOS_ENCODER_BACKEND", "torch").strip().lower()
+if ENCODER_BACKEND not in _BACKENDS:
+    print(f"[MODEL] Warning: unknown AIOS_ENCODER_BACKEND '{ENCODER_BACKEND}', using torch.")
+    ENCODER_BACKEND = "torch"
+
+# Identifies the vector space for on-disk caches.
+ENCODER_ID = MODEL_NAME + ("-int8" if ENCODER_BACKEND == "onnx-int8" else "")
+
+ONNX_DIR = Path.home() / ".aios" / "models" / MODEL_NAME
+_MAX_SEQ_LENGTH = 256  # matches SentenceTransformer(MODEL_NAME).max_seq_length
+
+_model = None
+_model_lock = threading.Lock()
+_warmup_thread: Optional[threading.Thread] = None
+
+
+# ---------------------------------------------------------------------------
+# ONNX Runtime backend
+# ---------------------------------------------------------------------------
+
+def _mean_pool(token_embeddings: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+    """Mask-aware mean over tokens followed by L2 normalisation.
+
+    Mirrors the Pooling + Normalize modules of the sentence-transformers
+    pipeline so both backends land in the same vector space.
+    """
+    mask = attention_mask[..., None].astype(np.float32)
+    summed = (token_embeddings * mask).sum(axis=1)
+    pooled = summed / np.clip(mask.sum(axis=1), 1e-9, None)
+    norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+    return (pooled / np.clip(norms, 1e-12, None)).astype(np.float32)
+
+
+def export_onnx(model_dir: Path = ONNX_DIR, quantize: bool = False) -> Path:
+    """Export MODEL_NAME to ONNX (and optionally int8) under *model_dir*.
+
+    Needs torch and sentence-transformers; only run when the graph is
+    missing.  Returns the path of the requested graph.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    model_dir = Path(model_dir)
+    model_dir.mkdir(parents=True, exist_ok=True)
+    fp32_path = model_dir / "model.onnx"
+
+    if not fp32_path.exists():
+        st = SentenceTransformer(MODEL_NAME, device="cpu")
+        st.tokenizer.save_pretrained(str(model_dir))
+
+        class _Encoder(torch.nn.Module):
+            def __init__(self, transformer):
+                super().__init__()
+                self.transformer = transformer
+
+            def forward(self, input_ids, attention_mask, token_type_ids):
+                return self.transformer(
+                    input_ids=input_ids,
+                    attention_mask=attention_mask,
+                    token_type_ids=token_type_ids,
+                ).last_hidden_state
+
+        # The TorchScript exporter needs no extra packages; newer torch
+        # defaults to the dynamo exporter, which requires onnxscript.
+        export_kwargs = {}
+        if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+            export_kwargs["dynamo"] = False
+
+        dummy = st.tokenizer(["warm up"], return_tensors="pt")
+        axes = {0: "batch", 1: "sequence"}
+        tmp_path = model_dir / "model.onnx.tmp"
+        torch.onnx.export(
+            _Encoder(st[0].auto_model).eval(),
+            (dummy["input_ids"], dummy["attention_mask"], dummy["token_type_ids"]),
+            str(tmp_path),
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": axes,
+                "attention_mask": axes,
+                "token_type_ids": axes,
+                "last_hidden_state": axes,
+            },
+            opset_version=14,
+            **export_kwargs,
+        )
+        os.replace(tmp_path, fp32_path)
+
+    if not quantize:
+        return fp32_path
+
+    int8_path = model_dir / "model-int8.onnx"
+    if not int8_path.exists():
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        tmp_path = model_dir / "model-int8.onnx.tmp"
+        quantize_dynamic(str(fp32_path), str(tmp_path), weight_type=QuantType.QInt8)
+        os.replace(tmp_path, int8_path)
+    return int8_path
+
+
+class OnnxEncoder:
+    """Drop-in replacement for SentenceTransformer.encode() on ONNX Runtime."""
+
+    def __init__(self, model_dir: Path = ONNX_DIR, quantize: bool = False) -> None:
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_dir = Path(model_dir)
+        graph = model_dir / ("model-int8.onnx" if quantize else "model.onnx")
+        if not graph.exists() or not (model_dir / "tokenizer.json").exists():
+            print(f"[MODEL] Exporting {MODEL_NAME} to ONNX (one-time)...")
+            graph = export_onnx(model_dir, quantize=quantize)
+
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=_MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            str(graph), options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32,
+               **_kwargs) -> np.ndarray:
+        """Return normalised float32 embeddings, shape (N, D) or (D,) for a str.
+
+        Extra SentenceTransformer keyword arguments (show_progress_bar,
+        convert_to_numpy, ...) are accepted and ignored.
+        """
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        chunks = []
+        for start in range(0, len(texts), batch_size):
+            batch = self.tokenizer.encode_batch(texts[start:start + batch_size])
+            feeds = {
+                "input_ids": np.array([e.ids for e in batch], dtype=np.int64),
+                "attention_mask": np.array([e.attention_mask for e in batch], dtype=np.int64),
+                "token_type_ids": np.array([e.type_ids for e in batch], dtype=np.int64),
+            }
+            feeds = {k: v for k, v in feeds.items() if k in self._input_names}
+            hidden = self.session.run(None, feeds)[0]
+            chunks.append(_mean_pool(hidden, feeds["attention_mask"]))
+        out = np.vstack(chunks) if chunks else np.zeros((0, 0), dtype=np.float32)
+        return out[0] if single else out
+
+
+def _load_model():
+    """Instantiate the configured backend, falling back to torch."""
+    if ENCODER_BACKEND != "torch":
+        try:
+            return OnnxEncoder(quantize=ENCODER_BACKEND == "onnx-int8")
+        except ImportError as exc:
+            print(f"[MODEL] Warning: {ENCODER_BACKEND} backend unavailable ({exc}); using torch.")
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(MODEL_NAME)
+
+
+def get_model():
+    """Return the shared encoder, loading it on first use.
+
+    Safe to call from several threads: a caller that arrives while the
+    warm-up thread is loading waits for that load instead of starting another.
+    """
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+                previous = logging.root.manager.disable
+                logging.disable(logging.CRITICAL)
+                try:
+                    _model = _load_model()
+                finally:
+                    logging.disable(previous)
+    return _model
+
+
+def is_loaded() -> bool:
+    """True once the model is resident (never triggers a load)."""
+    return _model is not None
+
+
+def warm_up(build_index: bool = True) -> threading.Thread:
+    """Load the model (and the router's intent matrix) on a daemon thread.
+
+    Idempotent: repeated calls return the thread started by the first one.
+
+    Args:
+        build_index: Also precompute the intent example matrix so the first
+                     command only pays for its own query encode.
+    """
+    global _warmup_thread
+    if _warmup_thread is not None:
+        return _warmup_thread
+
+    def _run():
+        try:
+            get_model()
+            if build_index:
+                import core.nlu_router as router
+                router.ensure_intent_embeddings()
+        except Exception as exc:
+            print(f"[MODEL] Warning: background warm-up failed: {exc}")
+
+    _warmup_thread = threading.Thread(target=_run, name="model-warmup", daemon=True)
+    _warmup_thread.start()
+    return _warmup_thread
+
+
+# ---------------------------------------------------------------------------
+# Shared query-embedding cache
+# ---------------------------------------------------------------------------
+
+# Every caller that embeds user text goes through encode() so repeated
+# strings are only run through the model once.  Cache misses from
+# concurrent front-ends are coalesced into one model call by the
+# embedding service (AIOS_ENCODE_WINDOW_MS, default 3 ms).  Set
+# AIOS_PERSIST_QUERY_CACHE=1 to keep the hottest entries across restarts.
+QUERY_CACHE_SIZE = 2048
+_QUERY_CACHE_PATH = os.path.join(
+    os.path.expanduser("~"), ".aios", "query_cache_" + ENCODER_ID + ".npz"
+)
+_query_cache = QueryCache(
+    maxsize=QUERY_CACHE_SIZE,
+    persist_path=_QUERY_CACHE_PATH
+    if os.environ.get("AIOS_PERSIST_QUERY_CACHE") == "1" else None,
+)
+if _query_cache.persist_path is not None:
+    _query_cache.load()
+    atexit.register(_query_cache.save)
+
+
+_service = EmbeddingService(
+    lambda batch: get_model().encode(batch),
+    window=float(os.environ.get("AIOS_ENCODE_WINDOW_MS", "3")) / 1000.0,
+)
+
+
+def encode(texts: List[str]) -> np.ndarray:
+    """Embed *texts* through the shared query cache; returns (len(texts), D)."""
+    return _query_cache.encode(texts, _service.encode)
+
+
+def encode_documents(texts: List[str]) -> np.ndarray:
+    """Embed document texts without the query cache; returns (len(texts), D).
+
+    Documents are long and each is embedded once per content change (the
+    caller persists the vectors), so caching them would only evict the
+    short command strings the LRU is sized for.
+    """
+    return np.asarray(_service.encode(texts), dtype=np.float32)
+
+
+def embedding_service_stats() -> dict:
+    """Request/batch counters of the micro-batching embedding service."""
+    return _service.stats()
+
+
+def query_cache_stats() -> dict:
+    """Hit/miss counters of the shared query-embedding cache."""
+    return _query_cache.stats()
+
+
+# ----------------------------------------------------------------------
+# Demo  (required by project rules: every module must expose run_demo())
+# ----------------------------------------------------------------------
+
+def run_demo() -> None:
+    """Warm the model in the background, then embed two commands."""
+    import time
+
+    print("=== Model Provider Demo ===\n")
+    t0 = time.perf_counter()
+    thread = warm_up(build_index=False)
+    print(f"warm_up() returned after {(time.perf_counter() - t0) * 1000:.1f} ms")
+    thread.join()
+    print(f"Model loaded after {time.perf_counter() - t0:.1f} s")
+
+    vecs = encode(["organize my downloads", "organize my downloads"])
+    print(f"Embedding shape: {vecs.shape}")
+    print(f"Query cache: {query_cache_stats()}")
+    print(f"Embedding service: {embedding_service_stats()}")
+    print(f"Encoder backend: {ENCODER_BACKEND} ({ENCODER_ID})")
+    print("\n=== Demo complete ===")
+
+
+# ----------------------------------------------------------------------
+# Tests
+# ----------------------------------------------------------------------
+
+def _run_tests() -> None:
+    """Self-contained tests for the backend-independent helpers."""
+    print("\n=== Running Tests ===\n")
+
+    # Test 1: padding tokens do not move the pooled vector
+    print("Test 1: mean pooling ignores padding and normalises")
+    hidden = np.array([[[1.0, 0.0], [3.0, 0.0], [100.0, 100.0]]], dtype=np.float32)
+    pooled = _mean_pool(hidden, np.array([[1, 1, 0]]))
+    assert np.allclose(pooled, [[1.0, 0.0]]), pooled
+    print("  PASSED\n")
+
+    # Test 2: ragged batch pools each row over its own tokens only
+    print("Test 2: rows of different lengths pool independently")
+    hidden = np.array([[[0.0, 2.0], [0.0, 2.0]], [[4.0, 0.0], [9.0, 9.0]]], dtype=np.float32)
+    pooled = _mean_pool(hidden, np.array([[1, 1], [1, 0]]))
+    assert np.allclose(pooled, [[0.0, 1.0], [1.0, 0.0]]), pooled
+    print("  PASSED\n")
+
+    print("=== All Tests Passed ===")
+
+
+if __name__ == "__main__":
+    run_demo()
+    _run_tests()
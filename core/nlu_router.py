@@ -3,14 +3,19 @@ import os
 import csv
 import sys
 import json
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Tuple, List
+from functools import lru_cache
+from typing import Dict, Tuple, List, Optional
 import numpy as np
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from db_manager import SQLiteManager
-from sentence_transformers import SentenceTransformer
 from core.ctr import CTR
+from core.vector_store import ShardedVectorStore
+from core.keyword_matcher import KeywordMatcher
 from core.session_context import get_context
 
 # --------------------------------------------------
@@ -26,17 +31,11 @@ _ADAPTATION_LOG = os.path.join(
 )
 
 # --------------------------------------------------
-# 1. Load embedding model (singleton)
+# 1. Embedding model — shared, lazily loaded instance owned by
+#    core.model_provider (re-exported here for existing callers)
 # --------------------------------------------------
 
-
-_model = None
-
-def get_model():
-    global _model
-    if _model is None:
-        _model = SentenceTransformer("all-MiniLM-L6-v2")
-    return _model
+from core.model_provider import MODEL_NAME, ENCODER_ID, get_model, encode, query_cache_stats
 
 
 # --------------------------------------------------
@@ -145,41 +144,405 @@ INTENT_EXAMPLES = {
 # 3. Precompute embeddings
 # --------------------------------------------------
 
+def _l2_normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-9)
+
+
+# Saved intents are classified in two stages once there are more than
+# SAVED_RESCORE_INTENTS of them: the query is compared with one centroid per
+# saved intent, and only the SAVED_RESCORE_INTENTS best are scored exactly
+# against their examples.  Built-in intents are always scored exactly.
+SAVED_RESCORE_INTENTS = 8
+# With this many saved intents the centroids themselves are probed through
+# an IVF index instead of scanned.
+ANN_MIN_ROWS = 2000
+
+
+class IntentIndex:
+    """Intent examples as L2-normalised float32 rows, scored in one product.
+
+    Rows belonging to one intent are contiguous: ``offsets[i]`` is the first
+    row of ``intents[i]`` and ``row_intent`` maps every row back to its
+    intent position, so scoring a batch of queries is one matrix product
+    followed by a segmented max (``np.maximum.reduceat``).
+
+    With more than SAVED_RESCORE_INTENTS SAVED: intents the search is
+    hierarchical: saved-intent centroids pick SAVED_RESCORE_INTENTS
+    candidates per query (through an IVFIndex from ANN_MIN_ROWS intents on)
+    and only those are scored exactly; the other saved intents score -1
+    (the cosine minimum).  Per-query work then grows with the number of
+    saved commands, not with the number of their paraphrases.  The saved
+    examples then stay in the blocks they were given (float16 slices of the
+    vector store's memory map) and only ``matrix`` holds built-in rows.
+    """
+
+    def __init__(self, blocks: Dict[str, np.ndarray],
+                 ann_centroids: Optional[np.ndarray] = None):
+        blocks = {k: np.atleast_2d(v) for k, v in blocks.items() if len(v)}
+        # Built-in intents first, so the exactly-scored rows are one slice.
+        blocks = dict(sorted(blocks.items(), key=lambda kv: kv[0].startswith("SAVED:")))
+        self.intents: List[str] = list(blocks)
+        self._blocks: List[np.ndarray] = list(blocks.values())
+        self._position = {name: i for i, name in enumerate(self.intents)}
+        self._n_exact = sum(not name.startswith("SAVED:") for name in self.intents)
+        hierarchical = len(self.intents) - self._n_exact > SAVED_RESCORE_INTENTS
+
+        # Rows scored by the matrix product: all of them, or only the
+        # built-in intents' rows once saved intents go through centroids.
+        dense = self._blocks[:self._n_exact] if hierarchical else self._blocks
+        counts = np.array([len(v) for v in dense], dtype=np.int64)
+        self.offsets = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.int64)
+        self.ends = self.offsets + counts
+        self.row_intent = np.repeat(np.arange(len(dense)), counts)
+        dim = self._blocks[0].shape[1] if self._blocks else 0
+        self.matrix = (_l2_normalize(np.concatenate(dense, axis=0)) if dense
+                       else np.zeros((0, dim), dtype=np.float32))
+
+        self._ann = None
+        self._saved_centroids = None
+        self._first_saved_row = int(self.ends[self._n_exact - 1]) if self._n_exact else 0
+        if hierarchical:
+            self._saved_centroids = _l2_normalize(np.stack([
+                _l2_normalize(block).mean(axis=0) for block in self._blocks[self._n_exact:]
+            ]))
+            if len(self._saved_centroids) >= ANN_MIN_ROWS:
+                from core.ann_index import IVFIndex
+                # Reuse the previous layout unless the saved set has grown a
+                # lot, so small edits only re-assign rows.
+                if (ann_centroids is not None
+                        and len(self._saved_centroids) > 4 * len(ann_centroids) ** 2):
+                    ann_centroids = None
+                self._ann = IVFIndex(self._saved_centroids, centroids=ann_centroids)
+
+    def __contains__(self, intent: str) -> bool:
+        return intent in self._position
+
+    def __getitem__(self, intent: str) -> np.ndarray:
+        i = self._position[intent]
+        if i < len(self.offsets):
+            return self.matrix[self.offsets[i]:self.ends[i]]
+        return _l2_normalize(self._blocks[i])
+
+    def items(self):
+        """Yield (intent, example_rows) pairs, like the old per-intent dict."""
+        for intent in self.intents:
+            yield intent, self[intent]
+
+    def replace(self, intent: str, vectors: np.ndarray) -> "IntentIndex":
+        """Return a new index with the rows of *intent* swapped for *vectors*.
+
+        Indexes are never modified in place, so a thread that is scoring
+        against the current one is unaffected by the swap.
+        """
+        blocks = dict(zip(self.intents, self._blocks))
+        blocks[intent] = np.atleast_2d(vectors)
+        return IntentIndex(blocks, self._ann_centroids())
+
+    def remove(self, intent: str) -> "IntentIndex":
+        """Return a new index without the rows of *intent*."""
+        blocks = {name: rows for name, rows in zip(self.intents, self._blocks)
+                  if name != intent}
+        return IntentIndex(blocks, self._ann_centroids())
+
+    def _ann_centroids(self) -> Optional[np.ndarray]:
+        return self._ann.centroids if self._ann is not None else None
+
+    def score(self, query_embeddings: np.ndarray) -> np.ndarray:
+        """Return a (Q, n_intents) array of best example similarity per intent."""
+        queries = _l2_normalize(np.atleast_2d(query_embeddings))
+        if self._saved_centroids is None:
+            similarities = queries @ self.matrix.T
+            return np.maximum.reduceat(similarities, self.offsets, axis=1)
+
+        scores = np.full((len(queries), len(self.intents)), -1.0, dtype=np.float32)
+        n_exact, first_saved = self._n_exact, self._first_saved_row
+        if n_exact:
+            scores[:, :n_exact] = np.maximum.reduceat(
+                queries @ self.matrix[:first_saved].T, self.offsets[:n_exact], axis=1)
+
+        # Stage 1: (candidate saved intents, centroid scores) per query.
+        if self._ann is not None:
+            candidates = zip(*self._ann.candidates(queries))
+        else:
+            every = np.arange(len(self._saved_centroids))
+            candidates = ((every, row) for row in queries @ self._saved_centroids.T)
+
+        # Stage 2: exact max-similarity over the best candidates' examples.
+        for q, (ids, centroid_scores) in enumerate(candidates):
+            k = min(SAVED_RESCORE_INTENTS, len(ids))
+            if k == 0:
+                continue
+            for c in ids[np.argpartition(-centroid_scores, k - 1)[:k]]:
+                i = n_exact + c
+                scores[q, i] = (_l2_normalize(self._blocks[i]) @ queries[q]).max()
+        return scores
+
+
 _INTENT_EMBEDDINGS = None
 
+# Serialises (re)builds of the intent matrix between the warm-up thread and
+# request threads.
+_INDEX_LOCK = threading.RLock()
+
+
+class RouteCache:
+    """Thread-safe LRU of (utterance, context fingerprint) → routed CTR JSON
+    and the classifier confidence behind it.
+
+    Entries are tagged with ``version``; invalidate() bumps it whenever the
+    intent set or a prototype changes, so a route computed against the old
+    index is never stored after the swap.
+    """
+
+    def __init__(self, maxsize: int = 256) -> None:
+        self.maxsize = maxsize
+        self.version = 0
+        self._entries: "OrderedDict[tuple, Tuple[str, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> Tuple[Optional[CTR], int, Optional[float]]:
+        """Return (cached CTR or None, version to pass back to put(), confidence)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, self.version, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            # A fresh CTR each time: executors may mutate params.
+            return CTR.from_json(entry[0]), self.version, entry[1]
+
+    def put(self, key: tuple, ctr: CTR, version: int,
+            confidence: Optional[float] = None) -> None:
+        with self._lock:
+            if version != self.version:
+                return
+            self._entries[key] = (ctr.to_json(), confidence)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Return size, intent-set version and hit/miss counters."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size":     len(self._entries),
+                "maxsize":  self.maxsize,
+                "version":  self.version,
+                "hits":     self.hits,
+                "misses":   self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+# Memoised route() results; invalidated whenever INTENT_EXAMPLES, the
+# intent matrix or the recorded corrections change.
+_ROUTE_CACHE = RouteCache()
+
+
+def route_cache_stats() -> dict:
+    """Hit/miss counters of the route() result cache."""
+    return _ROUTE_CACHE.stats()
+
+
+# On-disk example vectors, one float16 shard per intent
+# (~/.aios/vectors/<encoder>/), so a cold start only encodes examples that
+# were added or changed and saved-command rows stay memory-mapped.
+_EXAMPLE_STORE = None
+
+# Example cache of earlier versions (one float32 matrix per model); the
+# shards above replace it, so it is removed when they are first opened.
+_LEGACY_EXAMPLE_DIR = os.path.join(os.path.expanduser("~"), ".aios", "embeddings")
+
+def _get_example_store() -> ShardedVectorStore:
+    global _EXAMPLE_STORE
+    if _EXAMPLE_STORE is None:
+        _EXAMPLE_STORE = ShardedVectorStore(ENCODER_ID)
+        if os.path.isdir(_LEGACY_EXAMPLE_DIR):
+            import shutil
+            shutil.rmtree(_LEGACY_EXAMPLE_DIR, ignore_errors=True)
+    return _EXAMPLE_STORE
+
 def build_intent_embeddings():
     global _INTENT_EMBEDDINGS
-    model = get_model()
 
-    _INTENT_EMBEDDINGS = {}
-    for task, examples in INTENT_EXAMPLES.items():
-        _INTENT_EMBEDDINGS[task] = model.encode(examples)
+    with _INDEX_LOCK:
+        rebuilt = _INTENT_EMBEDDINGS is not None
+        _INTENT_EMBEDDINGS = _build_intent_index()
+        # Nothing can have been routed before the first build.
+        if rebuilt:
+            _ROUTE_CACHE.invalidate()
+
+
+def _build_intent_index() -> "IntentIndex":
+    blocks = _get_example_store().get_or_encode(
+        {task: list(examples) for task, examples in INTENT_EXAMPLES.items()},
+        lambda batch: get_model().encode(batch),
+    )
+    return IntentIndex(blocks)
+
+
+def ensure_intent_embeddings() -> "IntentIndex":
+    """Return the intent matrix, building it first if needed."""
+    index = _INTENT_EMBEDDINGS
+    if index is None:
+        with _INDEX_LOCK:
+            if _INTENT_EMBEDDINGS is None:
+                build_intent_embeddings()
+            index = _INTENT_EMBEDDINGS
+    return index
+
+
+def add_intent_examples(intent: str, phrases: List[str]) -> None:
+    """Register *intent* (or replace its examples) without a full rebuild.
+
+    Only *phrases* are encoded (and only those missing from the on-disk
+    store); their rows are spliced into the live intent matrix.  If the
+    matrix has not been built yet the phrases are simply picked up by the
+    first build.
+    """
+    global _INTENT_EMBEDDINGS
+    phrases = list(phrases)
+    if not phrases:
+        remove_intent(intent)
+        return
+
+    def _encode_phrases():
+        return _get_example_store().get_or_encode(
+            {intent: phrases}, lambda batch: get_model().encode(batch)
+        )[intent]
+
+    # Encode before taking the lock so a build is not held up by it.
+    vectors = _encode_phrases() if _INTENT_EMBEDDINGS is not None else None
+
+    with _INDEX_LOCK:
+        INTENT_EXAMPLES[intent] = phrases
+        _ROUTE_CACHE.invalidate()
+        if _INTENT_EMBEDDINGS is None:
+            return
+        if vectors is None:          # the matrix was built meanwhile
+            vectors = _encode_phrases()
+        _INTENT_EMBEDDINGS = _INTENT_EMBEDDINGS.replace(intent, vectors)
+
+
+def remove_intent(intent: str) -> bool:
+    """Drop *intent* from the examples and splice its rows out of the matrix.
+
+    Returns True if the intent was known.
+    """
+    global _INTENT_EMBEDDINGS
+    with _INDEX_LOCK:
+        existed = INTENT_EXAMPLES.pop(intent, None) is not None
+        _ROUTE_CACHE.invalidate()
+        _get_example_store().drop(intent)
+        if _INTENT_EMBEDDINGS is not None and intent in _INTENT_EMBEDDINGS:
+            _INTENT_EMBEDDINGS = _INTENT_EMBEDDINGS.remove(intent)
+            existed = True
+    return existed
+
+
+def _top_intents(index: "IntentIndex", scores: np.ndarray,
+                 k: int = 2) -> List[Tuple[str, float]]:
+    """Return the *k* best (intent, score) pairs from one row of scores."""
+    k = min(k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return [(index.intents[i], float(scores[i])) for i in top]
+
+
+def classify_embeddings(query_embeddings: np.ndarray) -> List[Tuple[str, float]]:
+    """Classify already-encoded queries; returns (intent, score) per row."""
+    index = ensure_intent_embeddings()
+    scores = index.score(query_embeddings)
+    best = np.argmax(scores, axis=1)
+    return [(index.intents[i], float(scores[row, i]))
+            for row, i in enumerate(best)]
+
+
+def classify_intents_batch(texts: List[str]) -> List[Tuple[str, float]]:
+    """Classify many texts with one encode call and one matrix product.
+
+    Unlike classify_intent() this never raises AmbiguousIntent;
+    the top-scoring intent is returned for every text.
+    """
+    if not texts:
+        return []
+    ensure_intent_embeddings()
+    return classify_embeddings(encode(list(texts)))
+
 
-def classify_intent(text: str) -> Tuple[str, float]:
-    if _INTENT_EMBEDDINGS is None:
-        build_intent_embeddings()
+class AmbiguousIntent(ValueError):
+    """Raised by classify_intent()/route() when the top-2 intents are too close.
 
-    model = get_model()
-    query_embedding = model.encode([text])[0]
+    The router never prompts: each front-end lets the user pick one of
+    ``candidates`` however suits it (terminal prompt, dialog, TUI key) and
+    passes the choice to resolve_ambiguity().  Callers that do not handle it
+    report it like any other ValueError from route().
 
-    # Collect (intent, best_score_for_intent) across all intents
-    all_scores: List[Tuple[str, float]] = []
-    for task, example_embeddings in _INTENT_EMBEDDINGS.items():
-        scores = np.dot(example_embeddings, query_embedding)
-        all_scores.append((task, float(np.max(scores))))
+    Attributes:
+        text:            The (context-resolved) utterance that was classified.
+        candidates:      [(intent, score), ...] best first.
+        query_embedding: Embedding of *text*, stored with the correction.
+    """
+
+    def __init__(self, text: str, candidates: List[Tuple[str, float]],
+                 query_embedding: np.ndarray) -> None:
+        self.text = text
+        self.candidates = candidates
+        self.query_embedding = query_embedding
+        names = " or ".join(name for name, _ in candidates)
+        super().__init__(f"Ambiguous command: did you mean {names}?")
+
+    def prompt(self) -> str:
+        """Numbered question for text front-ends."""
+        options = " or ".join(f"({i}) {name}"
+                              for i, (name, _) in enumerate(self.candidates, 1))
+        return f"Ambiguous command. Did you mean {options}? Enter 1 or {len(self.candidates)}:"
+
+    def choose(self, answer: str) -> str:
+        """Map a typed answer ("1", "2", ...) to an intent; defaults to the top one."""
+        answer = answer.strip()
+        if answer.isdigit() and 1 <= int(answer) <= len(self.candidates):
+            return self.candidates[int(answer) - 1][0]
+        return self.candidates[0][0]
+
+
+def classify_intent(text: str,
+                    query_embedding: Optional[np.ndarray] = None) -> Tuple[str, float]:
+    """Return the best (intent, score) for *text*.
 
-    # Sort descending by score
-    all_scores.sort(key=lambda x: x[1], reverse=True)
+    Pass *query_embedding* when *text* has already been encoded.
+
+    Raises:
+        AmbiguousIntent: the two best intents are within CONFIDENCE_THRESHOLD.
+    """
+    index = ensure_intent_embeddings()
+
+    if query_embedding is None:
+        query_embedding = encode([text])[0]
+
+    # Top-2 (intent, best_score_for_intent), highest first
+    all_scores = _top_intents(index, index.score(query_embedding)[0])
 
     best_task, best_score = all_scores[0]
 
     # ------------------------------------------------------------------
-    # Ambiguity resolution: if the top-2 scores are too close, ask user.
+    # Ambiguity: if the top-2 scores are too close, let the caller decide.
     # ------------------------------------------------------------------
 
     # If text contains an explicit file path, suppress ambiguity —
     # it is almost certainly a file operation, not an email.
-    has_explicit_path = bool(re.search(r'[~\/][\w\/\.\-]+', text))
+    has_explicit_path = bool(_EXPLICIT_PATH_RE.search(text))
     if has_explicit_path and best_task in [
         "FIND_RECEIPTS", "ORGANIZE_DOWNLOADS",
         "BULK_RENAME", "SCAN_PASSWORD_FIELDS",
@@ -192,47 +555,136 @@ def classify_intent(text: str) -> Tuple[str, float]:
         intent_2, score_2 = all_scores[1]
 
         if best_score >= 0.5 and (score_1 - score_2) < CONFIDENCE_THRESHOLD:
-            print(
-                f"\nAmbiguous command. Did you mean "
-                f"(1) {intent_1} or (2) {intent_2}? Enter 1 or 2:"
-            )
-            
-            try:
-                from cli.main import pause_spinner, resume_spinner
-                pause_spinner()
-            except ImportError:
-                resume_spinner = lambda: None
-                
-            try:
-                choice = input().strip()
-            except EOFError:
-                choice = "1"  # non-interactive fallback
-                
-            try:
-                resume_spinner()
-            except Exception:
-                pass
+            raise AmbiguousIntent(text, all_scores[:2], query_embedding)
 
-            correct_intent = intent_2 if choice == "2" else intent_1
-            best_task  = correct_intent
-            best_score = score_1  # report original top score
+    return best_task, float(best_score)
 
-            # --- Log correction to DB ---
-            try:
-                db = SQLiteManager()
-                db.insert("corrections", {
-                    "command_embedding": query_embedding.astype("float32").tobytes(),
-                    "correct_intent":   correct_intent,
-                    "timestamp":        datetime.utcnow().isoformat(),
-                })
-                db.close()
-            except Exception as _exc:
-                print(f"[NLU] Warning: could not save correction: {_exc}")
-
-            # --- Online prototype adaptation ---
-            _maybe_update_prototype(correct_intent, query_embedding)
 
-    return best_task, float(best_score)
+class PrototypeStore:
+    """Running mean of confirmed correction embeddings, per intent.
+
+    Keeps a count and a float64 sum vector for each intent, so folding in a
+    correction is O(dim) however many corrections exist.  The pair is
+    persisted in the intent_prototypes table alongside each corrections
+    row; if the two tables disagree (older databases, rows inserted by
+    other tools) the sums are rebuilt from corrections in one batched pass.
+    """
+
+    def __init__(self) -> None:
+        self._counts: Dict[str, int] = {}
+        self._sums: Dict[str, np.ndarray] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _ensure_loaded(self, db: SQLiteManager) -> None:
+        if self._loaded:
+            return
+        rows = db.fetch_all("intent_prototypes")
+        if sum(row["count"] for row in rows) != db.count_rows("corrections"):
+            self.replay(db)
+        else:
+            for row in rows:
+                self._counts[row["intent_name"]] = row["count"]
+                self._sums[row["intent_name"]] = np.frombuffer(
+                    row["sum_vector"], dtype=np.float64).copy()
+        self._loaded = True
+
+    def replay(self, db: SQLiteManager) -> None:
+        """Recompute every sum from the corrections table and persist them."""
+        rows = db.fetch_all("corrections")
+        self._counts, self._sums = {}, {}
+        if rows:
+            blobs = [row["command_embedding"] for row in rows]
+            # Skip vectors from a different encoder width, if any.
+            lengths = [len(blob) for blob in blobs]
+            width = max(set(lengths), key=lengths.count)
+            keep = [i for i, length in enumerate(lengths) if length == width]
+            vectors = np.frombuffer(b"".join(blobs[i] for i in keep),
+                                    dtype=np.float32).reshape(len(keep), -1)
+            intents, inverse = np.unique(
+                [rows[i]["correct_intent"] for i in keep], return_inverse=True)
+            sums = np.zeros((len(intents), vectors.shape[1]), dtype=np.float64)
+            np.add.at(sums, inverse, vectors)
+            counts = np.bincount(inverse, minlength=len(intents))
+            for j, intent in enumerate(intents):
+                self._counts[str(intent)] = int(counts[j])
+                self._sums[str(intent)] = sums[j]
+        db.replace_prototypes([(name, self._counts[name], self._sums[name].tobytes())
+                               for name in self._counts])
+
+    def add(self, intent: str, embedding: np.ndarray, db: SQLiteManager) -> int:
+        """Store a correction for *intent* and fold it into the mean.
+
+        Returns the intent's correction count after the update.
+        """
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        with self._lock:
+            self._ensure_loaded(db)
+            total = vector.astype(np.float64) + self._sums.get(intent, 0.0)
+            count = self._counts.get(intent, 0) + 1
+            db.record_correction(vector.tobytes(), intent, count, total.tobytes())
+            self._sums[intent], self._counts[intent] = total, count
+        return count
+
+    def mean(self, intent: str, db: SQLiteManager = None) -> Tuple[int, "np.ndarray"]:
+        """Return (count, mean correction vector or None) for *intent*."""
+        with self._lock:
+            if not self._loaded:
+                owned = db is None
+                db = db or SQLiteManager()
+                try:
+                    self._ensure_loaded(db)
+                finally:
+                    if owned:
+                        db.close()
+            count = self._counts.get(intent, 0)
+            if not count:
+                return 0, None
+            return count, (self._sums[intent] / count).astype(np.float32)
+
+
+_PROTOTYPES = PrototypeStore()
+
+
+# Corrections and prototype updates run here, one at a time and off the
+# request thread.  Worker threads are joined at interpreter exit, so queued
+# corrections are still written.
+_BACKGROUND = ThreadPoolExecutor(max_workers=1, thread_name_prefix="nlu-background")
+
+
+def record_correction_async(query_embedding: "np.ndarray", correct_intent: str) -> Future:
+    """Queue record_correction() on the background worker."""
+    def _run():
+        try:
+            return record_correction(query_embedding, correct_intent)
+        except Exception as _exc:
+            print(f"[NLU] Warning: could not save correction: {_exc}")
+    return _BACKGROUND.submit(_run)
+
+
+def run_in_background(fn, *args) -> Future:
+    """Queue fn(*args) on the background worker, logging any exception."""
+    def _run():
+        try:
+            return fn(*args)
+        except Exception as _exc:
+            print(f"[NLU] Warning: background task failed: {_exc}")
+    return _BACKGROUND.submit(_run)
+
+
+def record_correction(query_embedding: "np.ndarray", correct_intent: str) -> int:
+    """Persist a user-confirmed intent and adapt its prototype if due.
+
+    Returns the number of corrections recorded for *correct_intent*.
+    """
+    db = SQLiteManager()
+    try:
+        count = _PROTOTYPES.add(correct_intent, query_embedding, db)
+    finally:
+        db.close()
+    _ROUTE_CACHE.invalidate()
+    _maybe_update_prototype(correct_intent, query_embedding)
+    return count
 
 
 def _maybe_update_prototype(
@@ -248,23 +700,12 @@ def _maybe_update_prototype(
     """
     global _INTENT_EMBEDDINGS
 
-    db = SQLiteManager()
-    rows = db.fetch_where("corrections", "correct_intent", intent_name)
-    db.close()
-
-    count = len(rows)
+    count, mean_correction = _PROTOTYPES.mean(intent_name)
 
     # Update every 5 corrections, starting from 5
     if count < 5 or (count % 5) != 0:
         return
 
-    # Reconstruct correction embedding vectors
-    correction_vecs = [
-        np.frombuffer(row["command_embedding"], dtype=np.float32)
-        for row in rows
-    ]
-    mean_correction = np.mean(correction_vecs, axis=0)
-
     # Current prototype = mean of stored example embeddings for this intent
     if _INTENT_EMBEDDINGS is None or intent_name not in _INTENT_EMBEDDINGS:
         return
@@ -286,7 +727,11 @@ def _maybe_update_prototype(
 
     # Replace the stored embeddings with a single updated prototype vector
     # (broadcast as a (1, D) array so the rest of the pipeline is unaffected)
-    _INTENT_EMBEDDINGS[intent_name] = new_prototype.reshape(1, -1)
+    with _INDEX_LOCK:
+        if _INTENT_EMBEDDINGS is not None and intent_name in _INTENT_EMBEDDINGS:
+            _INTENT_EMBEDDINGS = _INTENT_EMBEDDINGS.replace(
+                intent_name, new_prototype.reshape(1, -1))
+            _ROUTE_CACHE.invalidate()
 
     # --- Append to adaptation log ---
     ts = datetime.utcnow().isoformat()
@@ -313,6 +758,59 @@ def _maybe_update_prototype(
 # 4. Parameter Extraction
 # --------------------------------------------------
 
+# Everything the extractors match is compiled once here, so the non-model
+# part of routing does no regex compilation and scans each keyword list
+# in a single pass (KeywordMatcher) instead of one `in` test per word.
+
+_PATH_RE = re.compile(r"(~\/[^\s]+|\/[^\s]+|\b[a-zA-Z0-9_\-]+\/?[a-zA-Z0-9_\-]*)")
+_EXPLICIT_PATH_RE = re.compile(r'[~\/][\w\/\.\-]+')
+
+_QUOTED_RE = re.compile(r'"([^"]+)"')
+_AND_COPY_TO_RE = re.compile(r'\s+and\s+copy\s+to\s+\S+')
+_COPY_TO_CLAUSE_RE = re.compile(r'\s+copy\s+to\s+\S+')
+_IN_CLAUSE_RE = re.compile(r'\s+in\s+\S+')
+_QUERY_NOISE_RE = re.compile(
+    r'\b(find|search|look|lookup|for|receipts?|receipt|documents?|document|and)\b')
+_APP_NOISE_RE = re.compile(
+    r'\b(generate|create|make|new|a|an|the|password|pass|pw|for|autofill|fill|copy|get|login|to|use|account|my|me|into|in|secure|strong)\b')
+
+_COPY_TO_RE = re.compile(r'copy\s+to\s+(\S+)', re.IGNORECASE)
+_IN_DIR_RE = re.compile(r'\bin\s+(\S+)', re.IGNORECASE)
+_TIME_RE = re.compile(r'(\d{1,2}(?::\d{2})?\s*(?:am|pm)|\d{2}:\d{2})', re.IGNORECASE)
+_WITH_NAME_RE = re.compile(r'\bwith\s+([a-zA-Z]+)', re.IGNORECASE)
+_TO_NAME_RE = re.compile(r'\bto\s+([a-zA-Z]+)', re.IGNORECASE)
+
+# Calendar title noise; the matched time and date are removed as well.
+_TITLE_NOISE_RE = re.compile(
+    r'\b(?:add|schedule|create|book|meeting|calendar|event|at|a|an|the|my|for|on|tomorrow|today)\b',
+    re.IGNORECASE)
+
+_CALENDAR_DATE_WORDS = ["tomorrow", "today", "monday", "tuesday",
+                        "wednesday", "thursday", "friday",
+                        "saturday", "sunday"]
+_CALENDAR_DAYS_AHEAD = {"today": 1, "tomorrow": 2,
+                        "week": 7, "this week": 7}
+
+_KEYWORDS = KeywordMatcher({
+    "calendar_delete": ["delete", "cancel", "remove", "unschedule"],
+    "calendar_list":   ["what", "show", "list", "check",
+                        "do i have", "schedule"],
+    "calendar_date":   _CALENDAR_DATE_WORDS,
+    "calendar_span":   list(_CALENDAR_DAYS_AHEAD),
+    "email_search":    ["receipt", "invoice", "document", "pdf",
+                        "file", "attachment", "report"],
+    "context_action":  ["mail", "send", "email", "forward",
+                        "move", "copy", "open", "attach",
+                        "share", "upload"],
+})
+
+
+@lru_cache(maxsize=256)
+def _whole_word_re(word: str) -> "re.Pattern":
+    """Case-insensitive whole-word pattern for a runtime value (cached)."""
+    return re.compile(r'\b' + re.escape(word) + r'\b', re.IGNORECASE)
+
+
 def extract_paths(text: str):
     """
     Extract:
@@ -320,8 +818,7 @@ def extract_paths(text: str):
     - /absolute/path
     - relative_folder
     """
-    path_pattern = r"(~\/[^\s]+|\/[^\s]+|\b[a-zA-Z0-9_\-]+\/?[a-zA-Z0-9_\-]*)"
-    return re.findall(path_pattern, text)
+    return _PATH_RE.findall(text)
 
 
 def extract_query_word(text: str):
@@ -335,21 +832,17 @@ def extract_query_word(text: str):
     text_lower = text.lower()
 
     # 1️⃣ Quoted text
-    quoted = re.findall(r'"([^"]+)"', text_lower)
+    quoted = _QUOTED_RE.findall(text_lower)
     if quoted:
         return quoted[0]
 
     # 2️⃣ Strip trailing clauses: "and copy to <dir>", then "in <dir>"
-    cleaned = re.sub(r'\s+and\s+copy\s+to\s+\S+', '', text_lower)
-    cleaned = re.sub(r'\s+copy\s+to\s+\S+', '', cleaned)
-    cleaned = re.sub(r'\s+in\s+\S+', '', cleaned)
+    cleaned = _AND_COPY_TO_RE.sub('', text_lower)
+    cleaned = _COPY_TO_CLAUSE_RE.sub('', cleaned)
+    cleaned = _IN_CLAUSE_RE.sub('', cleaned)
 
     # 3️⃣ Remove command verbs, filler words, and orphaned conjunctions
-    cleaned = re.sub(
-        r'\b(find|search|look|lookup|for|receipts?|receipt|documents?|document|and)\b',
-        '',
-        cleaned
-    )
+    cleaned = _QUERY_NOISE_RE.sub('', cleaned)
 
     cleaned = cleaned.strip()
 
@@ -368,8 +861,7 @@ def extract_app_name(text: str) -> str:
     """
     text = text.lower().strip()
     # Remove noise words, keep the meaningful noun(s)
-    noise = r'\b(generate|create|make|new|a|an|the|password|pass|pw|for|autofill|fill|copy|get|login|to|use|account|my|me|into|in|secure|strong)\b'
-    cleaned = re.sub(noise, '', text).strip()
+    cleaned = _APP_NOISE_RE.sub('', text).strip()
     # Collapse extra spaces, take first remaining token as the app name
     tokens = cleaned.split()
     return tokens[0] if tokens else text.split()[-1]
@@ -411,12 +903,12 @@ def build_ctr(task: str, text: str) -> CTR:
         export = None
 
         # Detect export FIRST (so "in" pattern doesn't eat it) — "copy to <dir>"
-        match_copy = re.search(r'copy\s+to\s+(\S+)', text, re.IGNORECASE)
+        match_copy = _COPY_TO_RE.search(text)
         if match_copy:
             export = match_copy.group(1)
 
         # Detect source after "in <dir>" (skip if it's part of copy-to fragment)
-        match_in = re.search(r'\bin\s+(\S+)', text, re.IGNORECASE)
+        match_in = _IN_DIR_RE.search(text)
         if match_in:
             candidate = match_in.group(1)
             # Ignore "in" matches that are part of the copy-to phrase
@@ -490,63 +982,39 @@ def build_ctr(task: str, text: str) -> CTR:
                    {"source_dir": source})
 
     elif task == "CALENDAR_TASK":
-        text_lower = text.lower()
+        found = _KEYWORDS.matches(text)
         
         # Determine action — check delete first, then list, else create
-        delete_words = ["delete", "cancel", "remove", "unschedule"]
-        list_words = ["what", "show", "list", "check",
-                      "do i have", "schedule"]
-        if any(w in text_lower for w in delete_words):
+        if "calendar_delete" in found:
             action = "delete"
-        elif any(w in text_lower for w in list_words):
+        elif "calendar_list" in found:
             action = "list"
         else:
             action = "create"
         
         # Extract time
-        time_match = re.search(
-            r'(\d{1,2}(?::\d{2})?\s*(?:am|pm)|\d{2}:\d{2})',
-            text, re.IGNORECASE)
+        time_match = _TIME_RE.search(text)
         time_str = time_match.group(1) if time_match else "09:00"
         
-        # Extract date
-        date_words = ["tomorrow", "today", "monday", "tuesday",
-                      "wednesday", "thursday", "friday", 
-                      "saturday", "sunday"]
-        date_str = "tomorrow"
-        for w in date_words:
-            if w in text_lower:
-                date_str = w
-                break
+        # Extract date — first listed date word present
+        date_str = found.get("calendar_date", ["tomorrow"])[0]
         
-        # Extract title — remove noise words
-        title = text
-        for noise in ["add", "schedule", "create", "book",
-                      "meeting", "calendar", "event", "at",
-                      time_str, date_str, "a", "an", "the",
-                      "my", "for", "on", "tomorrow", "today"]:
-            title = re.sub(
-                r'\b' + re.escape(noise) + r'\b', 
-                '', title, flags=re.IGNORECASE
-            )
+        # Extract title — remove the matched time/date, then noise words
+        title = _whole_word_re(time_str).sub('', text)
+        title = _whole_word_re(date_str).sub('', title)
+        title = _TITLE_NOISE_RE.sub('', title)
         title = " ".join(title.split()).strip()
         if not title:
             title = "Meeting"
         
         # Extract attendee
-        attendee_match = re.search(
-            r'\bwith\s+([a-zA-Z]+)', text, re.IGNORECASE)
+        attendee_match = _WITH_NAME_RE.search(text)
         attendee_name = (attendee_match.group(1) 
                          if attendee_match else None)
         
         # Days ahead for list
-        days_map = {"today": 1, "tomorrow": 2, 
-                    "week": 7, "this week": 7}
-        days_ahead = 1
-        for k, v in days_map.items():
-            if k in text_lower:
-                days_ahead = v
-                break
+        span = found.get("calendar_span")
+        days_ahead = _CALENDAR_DAYS_AHEAD[span[0]] if span else 1
         
         return CTR("CALENDAR_TASK", {
             "action": action,
@@ -559,8 +1027,7 @@ def build_ctr(task: str, text: str) -> CTR:
 
     elif task == "EMAIL_TASK":
         # Extract recipient name — word after "to"
-        to_match = re.search(
-            r'\bto\s+([a-zA-Z]+)', text, re.IGNORECASE)
+        to_match = _TO_NAME_RE.search(text)
         to_name = to_match.group(1) if to_match else "unknown"
         
         # Extract explicit file path if provided
@@ -570,16 +1037,10 @@ def build_ctr(task: str, text: str) -> CTR:
         explicit_attachment = (explicit_paths[0]
                                if explicit_paths else None)
 
-        # Detect receipt/document keywords suggesting
-        # a search is needed
-        search_keywords = [
-            "receipt", "invoice", "document", "pdf",
-            "file", "attachment", "report"
-        ]
         # Only search if no path was resolved from context
-        # AND search keywords are present
+        # AND receipt/document keywords are present
         needs_search = (
-            any(kw in text.lower() for kw in search_keywords)
+            "email_search" in _KEYWORDS.matches(text)
             and not explicit_attachment
         )
         
@@ -675,6 +1136,7 @@ def load_saved_commands_into_examples() -> None:
             pass
         
         _INTENT_EMBEDDINGS = None  # force rebuild
+        _ROUTE_CACHE.invalidate()
     except Exception as e:
         print(f"[NLU] Warning: could not load saved commands: {e}")
 
@@ -687,6 +1149,25 @@ except Exception:
 # 5. Context Resolution
 # --------------------------------------------------
 
+# Pronouns and vague references to replace.
+# Order matters — longer phrases are tried first.
+_REFERENCE_RES = [
+    (pattern, re.compile(r'\b' + re.escape(pattern) + r'\b', re.IGNORECASE))
+    for pattern in [
+        "that file",
+        "the file",
+        "that document",
+        "the document",
+        "the receipt",
+        "that receipt",
+        "the same file",
+        "the result",
+        "that",
+        "it",
+    ]
+]
+
+
 def resolve_context_references(text: str) -> str:
     """
     Replaces vague references in user text with concrete
@@ -707,47 +1188,18 @@ def resolve_context_references(text: str) -> str:
 
     primary_file = ctx.get_primary_file()
 
-    # Pronouns and vague references to replace
-    # Order matters — replace longer phrases first
-    reference_patterns = [
-        "that file",
-        "the file",
-        "that document",
-        "the document",
-        "the receipt",
-        "that receipt",
-        "the same file",
-        "the result",
-        "that",
-        "it",
-    ]
-
-    text_lower = text.lower()
-
     # Only resolve if the command looks like it wants
     # to use a previous result (send/mail/move/copy/open)
-    action_words = ["mail", "send", "email", "forward",
-                    "move", "copy", "open", "attach",
-                    "share", "upload"]
-
-    has_action = any(w in text_lower for w in action_words)
-    if not has_action:
+    if "context_action" not in _KEYWORDS.matches(text):
         return text
 
     # Check if text already has an explicit path
-    has_explicit_path = bool(re.search(
-        r'[~\/][\w\/\.\-]+', text))
-    if has_explicit_path:
+    if _EXPLICIT_PATH_RE.search(text):
         return text
 
     # Resolve references
     resolved = text
-    for pattern in reference_patterns:
-        # Case-insensitive replacement
-        regex = re.compile(
-            r'\b' + re.escape(pattern) + r'\b',
-            re.IGNORECASE
-        )
+    for pattern, regex in _REFERENCE_RES:
         if regex.search(resolved):
             resolved = regex.sub(primary_file, resolved,
                                   count=1)
@@ -762,53 +1214,348 @@ def resolve_context_references(text: str) -> str:
 # 6. Public Router
 # --------------------------------------------------
 
-MULTI_TASK_PATTERNS = [
-    (r'find.*and.*(?:mail|send|email)',
-     ["FIND_RECEIPTS", "EMAIL_TASK"]),
-    (r'search.*and.*(?:mail|send|email)',
-     ["FIND_RECEIPTS", "EMAIL_TASK"]),
-    (r'(?:mail|send|email).*receipt.*to',
-     ["FIND_RECEIPTS", "EMAIL_TASK"]),
+# Clause boundaries in multi-step commands: explicit sequencing words, or
+# a bare "and" directly followed by a command verb ("... and email it to
+# john").  "with john and sarah", "receipts and invoices" and "and copy to
+# <dir>" (part of FIND_RECEIPTS) stay in one clause.
+_CLAUSE_VERBS = (
+    "find", "search", "locate", "email", "e-mail", "mail", "send", "forward",
+    "open", "move", "rename", "organize", "organise", "clean", "sort", "tidy",
+    "create", "start", "make", "generate", "autofill", "fill", "login",
+    "add", "schedule", "book", "delete", "remove", "cancel", "show", "list",
+    "run", "zip", "compress", "backup", "download", "upload", "share",
+    "summarize", "summarise", "remind", "set", "lock", "unlock", "launch",
+    "close", "check", "copy",
+)
+_CLAUSE_SPLIT_RE = re.compile(
+    r"\s*(?:,\s*and\s+then|,\s*then|,\s*after\s+that|,\s*finally|;"
+    r"|\band\s+then\b|\bafter\s+that\b|\bthen\b|\bfinally\b"
+    r"|(?P<verb_and>,?\s*\band\b(?!\s+copy\s+to\b)(?=\s+(?:"
+    + "|".join(_CLAUSE_VERBS) + r")\b)))\s*,?\s*",
+    re.IGNORECASE)
+
+# "email the ipad receipt to john" implies a search before the email.
+_IMPLIED_FIND_RE = re.compile(r'(?:mail|send|email).*receipt.*to')
+
+# "find the amazon receipt and email it to john" is a search followed by
+# an email even when the email clause alone scores too low to plan it.
+_FIND_THEN_EMAIL_RE = re.compile(
+    r'(?:find|search).*\b(?:and|then)\b.*(?:mail|send|email)')
+_EMAIL_CLAUSE_RE = re.compile(r'(?:mail|send|email)')
+
+# Every clause must reach this score, otherwise the command is treated
+# as a single intent.
+MULTI_TASK_MIN_SCORE = 0.5
+
+
+def split_clauses(text: str) -> List[str]:
+    """Split a command on sequencing words ("then", "after that", "and <verb>", ...)."""
+    return _split_clauses(text)[0]
+
+
+def _split_clauses(text: str) -> Tuple[List[str], List[bool]]:
+    """Return (clauses, verb_and) for *text*.
+
+    ``verb_and[i]`` is True when clauses i and i+1 were split only on a
+    bare "and"; such a split stands only if the two sides classify as
+    different intents (see _plan_steps).
+    """
+    clauses: List[str] = []
+    verb_and: List[bool] = []
+    pos, soft = 0, True
+    for match in _CLAUSE_SPLIT_RE.finditer(text):
+        part = text[pos:match.start()].strip(" ,.")
+        pos = match.end()
+        if part:
+            if clauses:
+                verb_and.append(soft)
+            clauses.append(part)
+            soft = True
+        soft = soft and match.group("verb_and") is not None
+    part = text[pos:].strip(" ,.")
+    if part:
+        if clauses:
+            verb_and.append(soft)
+        clauses.append(part)
+    return clauses, verb_and
+
+
+def _plan_steps(clauses: List[str],
+                clause_intents: List[Tuple[str, float]],
+                verb_and: Optional[List[bool]] = None) -> Optional[List[Tuple[str, str]]]:
+    """Return [(task, clause), ...] for a multi-step command, or None.
+
+    Every clause must map confidently onto a built-in intent; saved
+    commands, low-scoring clauses and one-word clauses make the whole
+    command single-step.  So does a bare-"and" split (*verb_and*, from
+    _split_clauses) whose two sides have the same intent.
+    """
+    steps: List[Tuple[str, str]] = []
+    for i, (clause, (intent, score)) in enumerate(zip(clauses, clause_intents)):
+        if _IMPLIED_FIND_RE.search(clause.lower()):
+            if not steps or steps[-1][0] != "FIND_RECEIPTS":
+                steps.append(("FIND_RECEIPTS", clause))
+            steps.append(("EMAIL_TASK", clause))
+            continue
+        if (score < MULTI_TASK_MIN_SCORE or intent.startswith("SAVED:")
+                or len(clause.split()) < 2):
+            return None
+        if i and verb_and and verb_and[i - 1] and steps[-1][0] == intent:
+            return None
+        steps.append((intent, clause))
+    return steps if len(steps) >= 2 else None
+
+
+def _fallback_steps(original_text: str,
+                    clauses: List[str]) -> Optional[List[Tuple[str, str]]]:
+    """Return FIND_RECEIPTS → EMAIL_TASK steps for a find-then-email command, or None.
+
+    Used when the clauses could not be planned one by one.  The clauses
+    before the first one that mentions mailing form the search, the rest
+    the email; without such a split both steps read the whole command.
+    """
+    lowered = original_text.lower()
+    if _FIND_THEN_EMAIL_RE.search(lowered):
+        split = next((i for i, clause in enumerate(clauses)
+                      if i > 0 and _EMAIL_CLAUSE_RE.search(clause.lower())), None)
+        if split is not None:
+            return [("FIND_RECEIPTS", " and ".join(clauses[:split])),
+                    ("EMAIL_TASK", " and ".join(clauses[split:]))]
+    elif not _IMPLIED_FIND_RE.search(lowered):
+        return None
+    return [("FIND_RECEIPTS", original_text), ("EMAIL_TASK", original_text)]
+
+
+def _link_steps(ctrs: List[CTR]) -> None:
+    """Feed each step's result into the next where the executor supports it.
+
+    "find the ipad receipt and email it to john": the email has no
+    attachment of its own, so it searches with the FIND step's query.
+    """
+    for prev, ctr in zip(ctrs, ctrs[1:]):
+        attachment = ctr.params.get("attachment_path") or ""
+        if (prev.task_type == "FIND_RECEIPTS" and ctr.task_type == "EMAIL_TASK"
+                and not _EXPLICIT_PATH_RE.match(attachment)):
+            ctr.params["attachment_path"] = None
+            ctr.params["needs_search"] = True
+            ctr.params["search_query"] = prev.params.get("query") or "receipt"
+            ctr.params["search_dir"] = prev.params.get("source_dir") or "~/Downloads"
+
+
+def _route_multi(original_text: str, clauses: List[str],
+                 clause_embeddings: Optional[np.ndarray],
+                 verb_and: Optional[List[bool]] = None) -> Optional[CTR]:
+    """Build a MULTI_TASK CTR if *clauses* form a sequence of known intents."""
+    if clause_embeddings is not None:
+        steps = _plan_steps(clauses, classify_embeddings(clause_embeddings), verb_and)
+    else:
+        steps = None
+    if steps is None:
+        steps = _fallback_steps(original_text, clauses)
+        if steps is None:
+            return None
+    # Only the first clause can refer to earlier commands; "it" in later
+    # clauses means the previous step's result.  Steps that read the
+    # whole command share its resolved text.
+    first = steps[0][1]
+    resolved = resolve_context_references(first)
+    steps = [(task, resolved if clause == first else clause)
+             for task, clause in steps]
+
+    task_sequence = [task for task, _ in steps]
+    print(f"\n  [NLU] Multi-step command detected.")
+    print(f"  Will execute: "
+          f"{' → '.join(task_sequence)}\n")
+
+    ctrs = []
+    for task, clause in steps:
+        try:
+            ctrs.append(build_ctr(task, clause))
+        except Exception:
+            return None
+    _link_steps(ctrs)
+
+    return CTR(
+        task_type="MULTI_TASK",
+        params={
+            "tasks": [json.loads(c.to_json()) for c in ctrs],
+            "description": original_text
+        }
+    )
+
+
+# Fast path: commands whose wording alone settles the intent are built
+# without encoding.  Every pattern is anchored at both ends, so anything
+# beyond the plain form ("... by topic", a second clause) goes through the
+# embedding classifier instead.
+_FAST_RULES = [
+    ("GENERATE_PASSWORD", re.compile(
+        r"^(?:please\s+)?(?:generate|create|make)\s+(?:me\s+)?(?:a\s+)?(?:new\s+)?"
+        r"(?:strong\s+|secure\s+|random\s+)?password\s+for\s+[\w.\-]+$", re.IGNORECASE)),
+    ("AUTOFILL_APP", re.compile(
+        r"^autofill\s+(?:my\s+)?[\w.\-]+$", re.IGNORECASE)),
+    ("ORGANIZE_DOWNLOADS", re.compile(
+        r"^(?:please\s+)?(?:organi[sz]e|clean(?:\s+up)?|tidy(?:\s+up)?)\s+"
+        r"(?:my\s+|the\s+)?downloads(?:\s+folder)?$", re.IGNORECASE)),
+    ("BULK_RENAME", re.compile(
+        r"^(?:bulk\s+)?rename\s+(?:all\s+)?(?:the\s+|my\s+)?(?:files|photos|images|pictures)"
+        r"\s+in\s+[~/]\S*$", re.IGNORECASE)),
+    ("FIND_RECEIPTS", re.compile(
+        r"^(?:find|search\s+for|locate)\s+(?:my\s+|the\s+)?(?:[\w\-]+\s+){0,3}"
+        r"(?:receipts?|invoices?)(?:\s+in\s+[~/]\S+)?(?:\s+and\s+copy\s+to\s+\S+)?$",
+        re.IGNORECASE)),
+    ("CREATE_PROJECT_SCAFFOLD", re.compile(
+        r"^(?:create|start)\s+(?:a\s+)?(?:new\s+)?(?:python\s+)?project\s+"
+        r"(?:called|named)\s+[\w.\-]+$", re.IGNORECASE)),
 ]
 
 
+@lru_cache(maxsize=1)
+def _saved_phrases(version: int) -> frozenset:
+    """Lower-cased SAVED: paraphrases for intent-set *version*."""
+    return frozenset(phrase.lower() for intent, phrases in INTENT_EXAMPLES.items()
+                     if intent.startswith("SAVED:") for phrase in phrases)
+
+
+def _fast_route(text: str) -> Optional[CTR]:
+    """build_ctr() for *text* if a fast-path rule settles its intent, else None.
+
+    A saved command trained on exactly this wording, or a disabled
+    feature, always goes through the embedding classifier.
+    """
+    if text.lower() in _saved_phrases(_ROUTE_CACHE.version):
+        return None
+    for intent, pattern in _FAST_RULES:
+        if intent in INTENT_EXAMPLES and pattern.match(text):
+            return build_ctr(intent, text)
+    return None
+
+
+# How each routed command was answered: "cache", "fast_path", "multi_task",
+# "saved", "llm" or "embedding" (which includes ambiguous and unrecognised
+# commands).
+_ROUTE_PATHS: Counter = Counter()
+_ROUTE_PATHS_LOCK = threading.Lock()
+
+
+def _count_route(path: str) -> None:
+    with _ROUTE_PATHS_LOCK:
+        _ROUTE_PATHS[path] += 1
+
+
+def route_path_stats() -> dict:
+    """Number and fraction of route() calls answered by each path."""
+    with _ROUTE_PATHS_LOCK:
+        counts = dict(_ROUTE_PATHS)
+    total = sum(counts.values())
+    return {
+        "total":     total,
+        "counts":    counts,
+        "fractions": {path: n / total for path, n in counts.items()},
+    }
+
+
+def _context_fingerprint() -> Optional[str]:
+    """The part of the session context that routing can depend on."""
+    ctx = get_context()
+    return ctx.get_primary_file() if ctx.has_recent_file() else None
+
+
 def route(text: str) -> CTR:
+    """Route *text* to a CTR, reusing the result for repeated commands.
+
+    Results are memoised per (whitespace-normalised text, context
+    fingerprint) until the intent set changes or a correction is
+    recorded.  LLM plans are not cached, and neither are saved commands:
+    their plan is read from user_commands, which another process may
+    edit or delete without touching this cache.  route_path_stats()
+    reports how many commands were answered from the cache, the keyword
+    fast path or the embedding classifier, and last_route_confidence()
+    the confidence behind this thread's latest result.
+    """
+    text = " ".join(text.split())
+    key = (text, _context_fingerprint())
+    _LAST_ROUTE.confidence = None
+    cached, version, confidence = _ROUTE_CACHE.get(key)
+    if cached is not None:
+        _count_route("cache")
+        _LAST_ROUTE.confidence = confidence
+        return cached
+
+    try:
+        ctr, path, confidence = _route_uncached(text)
+    except Exception:
+        _count_route("embedding")
+        raise
+    _count_route(path)
+    if path not in ("saved", "llm"):
+        _ROUTE_CACHE.put(key, ctr, version, confidence)
+    _LAST_ROUTE.confidence = confidence
+    return ctr
+
+
+# Per-thread confidence of the latest route() result, for front-ends that
+# display it without classifying the command a second time.
+_LAST_ROUTE = threading.local()
+
+
+def last_route_confidence() -> Optional[float]:
+    """Confidence behind this thread's latest route() result.
+
+    1.0 for the keyword fast path, None for multi-step commands or when
+    route() raised.
+    """
+    return getattr(_LAST_ROUTE, "confidence", None)
+
+
+def _route_uncached(text: str) -> Tuple[CTR, str, Optional[float]]:
+    """Route *text*; returns the CTR, the path that produced it and its confidence."""
     original_text = text  # save before any resolution
+
+    # Multi-step detection runs on the ORIGINAL text so a resolved path
+    # (e.g. ".../receipt.pdf") can't create clauses of its own.  The
+    # command and all its clauses are encoded in one batch.
+    clauses, verb_and = _split_clauses(original_text)
+    embeddings = (encode([original_text] + clauses)
+                  if len(clauses) >= 2 else None)
+    multi = _route_multi(original_text, clauses,
+                         embeddings[1:] if embeddings is not None else None,
+                         verb_and)
+    if multi is not None:
+        return multi, "multi_task", None
+
+    if embeddings is None:
+        fast = _fast_route(original_text)
+        if fast is not None:
+            return fast, "fast_path", 1.0
+
     # Resolve any context references before classification
-    text = resolve_context_references(text)
-
-    # Detect explicit multi-task commands — run on ORIGINAL text
-    # so a resolved path (e.g. ".../receipt.pdf") doesn't falsely
-    # trigger the ".*receipt.*" pattern.
-    for pattern, task_sequence in MULTI_TASK_PATTERNS:
-        if re.search(pattern, original_text.lower()):
-            print(f"\n  [NLU] Multi-step command detected.")
-            print(f"  Will execute: "
-                  f"{' → '.join(task_sequence)}\n")
-
-            # Build CTRs for each task in sequence
-            ctrs = []
-            for task in task_sequence:
-                try:
-                    ctr = build_ctr(task, text)
-                    ctrs.append(ctr)
-                except Exception:
-                    pass
-
-            if len(ctrs) == len(task_sequence):
-                # Return a special MULTI_TASK CTR
-                return CTR(
-                    task_type="MULTI_TASK",
-                    params={
-                        "tasks": [json.loads(c.to_json())
-                                  for c in ctrs],
-                        "description": text
-                    }
-                )
-            break
+    text = resolve_context_references(original_text)
+    query_embedding = (embeddings[0] if embeddings is not None
+                       and text == original_text else None)
+    best_task, confidence = classify_intent(text, query_embedding)
+    ctr = _ctr_for_intent(best_task, confidence, text)
+    if best_task.startswith("SAVED:"):
+        path = "saved"
+    elif ctr.params.get("_from_llm"):
+        path = "llm"
+    else:
+        path = "embedding"
+    return ctr, path, confidence
+
+
+def resolve_ambiguity(ambiguity: AmbiguousIntent, intent: str) -> CTR:
+    """Finish routing an ambiguous command once the user has picked *intent*.
+
+    The choice is stored as a correction (and may adapt the prototype) on
+    the background worker; the CTR is returned immediately.
+    """
+    record_correction_async(ambiguity.query_embedding, intent)
+    return _ctr_for_intent(intent, ambiguity.candidates[0][1], ambiguity.text)
 
-    best_task, confidence = classify_intent(text)
 
+def _ctr_for_intent(best_task: str, confidence: float, text: str) -> CTR:
+    """Turn a classified intent into a CTR (saved command, LLM plan or build_ctr)."""
     # Handle saved command retrieval
     if best_task and best_task.startswith("SAVED:"):
         command_name = best_task[len("SAVED:"):]
@@ -856,3 +1603,77 @@ def route(text: str) -> CTR:
         raise ValueError(f"Low confidence intent detection ({confidence:.2f})")
 
     return build_ctr(best_task, text)
+
+
+# ----------------------------------------------------------------------
+# Tests
+# ----------------------------------------------------------------------
+
+def _run_tests() -> None:
+    """Self-contained test cases for multi-step planning (no model needed)."""
+    print("\n=== Running Tests ===\n")
+
+    # Test 1: a weak email clause alone does not make a plan
+    print("Test 1: low-scoring clause rejects the clause plan")
+    clauses = split_clauses("find the amazon receipt and email it to john")
+    assert clauses == ["find the amazon receipt", "email it to john"]
+    assert _plan_steps(clauses, [("FIND_RECEIPTS", 0.8), ("EMAIL_TASK", 0.4)]) is None
+    print("  PASSED\n")
+
+    # Test 2: find-then-email still becomes FIND_RECEIPTS → EMAIL_TASK
+    print("Test 2: find → email fallback links the steps")
+    for text in ["find the amazon receipt and email it to john",
+                 "search for the amazon receipt then send it to john"]:
+        multi = _route_multi(text, split_clauses(text), None)
+        assert multi is not None and multi.task_type == "MULTI_TASK", text
+        find, email = multi.params["tasks"]
+        assert find["task_type"] == "FIND_RECEIPTS" and email["task_type"] == "EMAIL_TASK"
+        assert "amazon" in find["params"]["query"]
+        assert email["params"]["needs_search"] is True
+        assert email["params"]["search_query"] == find["params"]["query"]
+    print("  PASSED\n")
+
+    # Test 3: commands without a find → email shape are left alone
+    print("Test 3: other commands are not forced into MULTI_TASK")
+    for text in ["rename photos and videos", "find my receipts and copy to ~/tax"]:
+        assert _route_multi(text, split_clauses(text), None) is None, text
+    print("  PASSED\n")
+
+    # Test 4: a bare "and" inside one command does not split it
+    print("Test 4: same-intent \"and\" phrasing stays single-step")
+    for text in ["add a meeting with john and sarah tomorrow at 3pm",
+                 "find receipts and invoices in ~/Documents",
+                 "rename photos and videos in ~/Pictures"]:
+        assert split_clauses(text) == [text], text
+    assert split_clauses("clean my downloads and then autofill spotify") == [
+        "clean my downloads", "autofill spotify"]
+    print("  PASSED\n")
+
+    # Test 5: an "and <verb>" split needs two different intents
+    print("Test 5: \"and <verb>\" split is kept only across intents")
+    clauses, verb_and = _split_clauses("find the tax receipt and find the ipad invoice")
+    assert len(clauses) == 2 and verb_and == [True]
+    same = [("FIND_RECEIPTS", 0.9), ("FIND_RECEIPTS", 0.9)]
+    assert _plan_steps(clauses, same, verb_and) is None
+    assert _plan_steps(clauses, same, [False]) is not None   # "... then find ..."
+    clauses, verb_and = _split_clauses("clean my downloads and autofill spotify")
+    steps = _plan_steps(clauses, [("ORGANIZE_DOWNLOADS", 0.9), ("AUTOFILL_APP", 0.9)], verb_and)
+    assert [task for task, _ in steps] == ["ORGANIZE_DOWNLOADS", "AUTOFILL_APP"]
+    print("  PASSED\n")
+
+    # Test 6: the route cache returns the confidence stored with a CTR
+    print("Test 6: RouteCache keeps the routing confidence")
+    cache = RouteCache(maxsize=2)
+    ctr, version, confidence = cache.get(("x", None))
+    assert ctr is None and confidence is None
+    cache.put(("x", None), CTR("ORGANIZE_DOWNLOADS", {"source_dir": "~/Downloads"}),
+              version, 0.83)
+    ctr, _, confidence = cache.get(("x", None))
+    assert ctr.task_type == "ORGANIZE_DOWNLOADS" and confidence == 0.83
+    print("  PASSED\n")
+
+    print("=== All Tests Passed ===")
+
+
+if __name__ == "__main__":
+    _run_tests()
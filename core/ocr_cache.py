@@ -0,0 +1,231 @@
+"""
+core/ocr_cache.py
+
+Persistent store of OCR results for receipt search.
+
+Rasterising a PDF and running Tesseract over it takes seconds per file,
+and the same Documents folders are searched again and again.  OCRCache
+remembers the text of every file it has seen in ~/.aios/ocr_cache.db,
+keyed by path, size, mtime and a hash of the content:
+
+  - path, size and mtime_ns unchanged  → hit without reading the file
+  - size or mtime changed, same hash   → hit (touched, restored or copied
+                                         file); the row is re-stamped
+  - anything else                      → miss; the caller OCRs and put()s
+
+The hash lookup is not limited to the file's own path, so a receipt that
+was moved or duplicated is not OCR'd again either.
+
+Only the Python standard library is used.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+OCR_CACHE_PATH = Path.home() / ".aios" / "ocr_cache.db"
+
+_HASH_CHUNK = 1 << 20
+
+
+def file_digest(path: Path) -> str:
+    """Return a 128-bit BLAKE2b hex digest of the file's content."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class OCRCache:
+    """Path → OCR text, invalidated by size, mtime and content hash.
+
+    Args:
+        db_path: SQLite file holding the cache (created if missing).
+    """
+
+    def __init__(self, db_path: Path = OCR_CACHE_PATH) -> None:
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), timeout=5.0,
+                                     check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS ocr_text ("
+                " path     TEXT    PRIMARY KEY,"
+                " size     INTEGER NOT NULL,"
+                " mtime_ns INTEGER NOT NULL,"
+                " digest   TEXT    NOT NULL,"
+                " text     TEXT    NOT NULL,"
+                " updated_at TEXT  NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS ocr_text_digest ON ocr_text (digest)")
+        self._lock = threading.Lock()
+        # Digests computed by a missed get(), reused by the following put().
+        self._digests: Dict[Tuple[str, int, int], str] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _stamp(path: Path) -> Tuple[str, int, int]:
+        st = os.stat(path)
+        return str(Path(path).resolve()), st.st_size, st.st_mtime_ns
+
+    def get(self, path: Path) -> Optional[str]:
+        """Return the cached text for *path*, or None if it must be OCR'd."""
+        key, size, mtime_ns = self._stamp(path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, text FROM ocr_text WHERE path = ?", (key,)
+            ).fetchone()
+            if row and row[0] == size and row[1] == mtime_ns:
+                self.hits += 1
+                return row[2]
+
+        digest = file_digest(path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text FROM ocr_text WHERE digest = ? AND size = ? LIMIT 1",
+                (digest, size),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                self._digests[(key, size, mtime_ns)] = digest
+                return None
+            self._upsert(key, size, mtime_ns, digest, row[0])
+            self.hits += 1
+            return row[0]
+
+    def put(self, path: Path, text: str) -> None:
+        """Store the OCR *text* of *path* at its current size and mtime."""
+        stamp = self._stamp(path)
+        with self._lock:
+            digest = self._digests.pop(stamp, None)
+        if digest is None:
+            digest = file_digest(path)
+        with self._lock:
+            self._upsert(*stamp, digest, text)
+
+    def _upsert(self, key: str, size: int, mtime_ns: int, digest: str, text: str) -> None:
+        with self._conn:
+            self._conn.execute(
+                "INSERT INTO ocr_text (path, size, mtime_ns, digest, text, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(path) DO UPDATE SET "
+                "size = excluded.size, mtime_ns = excluded.mtime_ns, "
+                "digest = excluded.digest, text = excluded.text, "
+                "updated_at = excluded.updated_at",
+                (key, size, mtime_ns, digest, text, datetime.utcnow().isoformat()),
+            )
+
+    def stats(self) -> dict:
+        """Return hit/miss counters for this instance and the stored row count."""
+        with self._lock:
+            rows = self._conn.execute("SELECT COUNT(*) FROM ocr_text").fetchone()[0]
+            return {"hits": self.hits, "misses": self.misses, "rows": rows}
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+
+# ----------------------------------------------------------------------
+# Demo  (required by project rules: every module must expose run_demo())
+# ----------------------------------------------------------------------
+
+def run_demo() -> None:
+    """Look up a file twice, then after touching and after editing it."""
+    import tempfile
+    import time
+
+    print("=== OCR Cache Demo ===\n")
+    with tempfile.TemporaryDirectory() as tmp:
+        receipt = Path(tmp) / "receipt.png"
+        receipt.write_bytes(b"fake image bytes")
+        with OCRCache(Path(tmp) / "ocr.db") as cache:
+            for step in ["first search", "second search", "after touch", "after edit"]:
+                if step == "after touch":
+                    os.utime(receipt, ns=(time.time_ns(), time.time_ns() + 10**9))
+                elif step == "after edit":
+                    receipt.write_bytes(b"different image bytes")
+                text = cache.get(receipt)
+                if text is None:
+                    text = "TOTAL $12.50"        # stand-in for Tesseract
+                    cache.put(receipt, text)
+                    print(f"{step:<14} miss → OCR'd")
+                else:
+                    print(f"{step:<14} hit  → {text!r}")
+            print(f"\nStats: {cache.stats()}")
+    print("\n=== Demo complete ===")
+
+
+# ----------------------------------------------------------------------
+# Tests
+# ----------------------------------------------------------------------
+
+def _run_tests() -> None:
+    """Self-contained test cases for OCRCache."""
+    import shutil
+    import tempfile
+    import time
+
+    print("\n=== Running Tests ===\n")
+
+    # Test 1: results survive a new instance
+    print("Test 1: stored text is served across instances")
+    with tempfile.TemporaryDirectory() as tmp:
+        doc = Path(tmp) / "a.pdf"
+        doc.write_bytes(b"pdf one")
+        with OCRCache(Path(tmp) / "c.db") as cache:
+            assert cache.get(doc) is None
+            cache.put(doc, "coffee 4.20")
+        with OCRCache(Path(tmp) / "c.db") as cache:
+            assert cache.get(doc) == "coffee 4.20"
+            assert cache.stats() == {"hits": 1, "misses": 0, "rows": 1}
+    print("  PASSED\n")
+
+    # Test 2: a new mtime with the same bytes is still a hit; new bytes miss
+    print("Test 2: content hash decides when the stamp changes")
+    with tempfile.TemporaryDirectory() as tmp:
+        doc = Path(tmp) / "a.png"
+        doc.write_bytes(b"image")
+        with OCRCache(Path(tmp) / "c.db") as cache:
+            cache.get(doc)
+            cache.put(doc, "old text")
+            later = time.time_ns() + 10**9
+            os.utime(doc, ns=(later, later))
+            assert cache.get(doc) == "old text"
+            doc.write_bytes(b"other")
+            assert cache.get(doc) is None
+    print("  PASSED\n")
+
+    # Test 3: a copied file is recognised by its hash
+    print("Test 3: copies reuse the original's text")
+    with tempfile.TemporaryDirectory() as tmp:
+        doc = Path(tmp) / "a.jpg"
+        doc.write_bytes(b"jpeg")
+        copy = Path(tmp) / "copy.jpg"
+        with OCRCache(Path(tmp) / "c.db") as cache:
+            cache.put(doc, "lunch 9.99")
+            shutil.copy(doc, copy)
+            assert cache.get(copy) == "lunch 9.99"
+            assert cache.stats()["rows"] == 2
+    print("  PASSED\n")
+
+    print("=== All Tests Passed ===")
+
+
+if __name__ == "__main__":
+    run_demo()
+    _run_tests()
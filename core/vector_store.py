@@ -0,0 +1,402 @@
+"""
+core/vector_store.py
+
+Sharded, memory-mapped float16 vector store.
+
+The router keeps one shard per intent (built-in intents and every
+SAVED:<command>).  A shard is two files under ~/.aios/vectors/<encoder id>/:
+
+  <shard>.keys       — JSON lines: a header {"shard", "dim", "gen"}, then
+                       {"k": key, "r": row} for every appended row and
+                       {"d": key} for every tombstone
+  <shard>.<gen>.vec  — raw float16 rows, appended in place
+
+Vectors are read through np.memmap, so a long-running process only keeps
+the pages it actually scores in memory, at half the size of float32.
+Appends and deletes only add to the end of the files.  A shard is
+rewritten ("compacted") under a new generation once dead rows outnumber
+live ones.
+
+Writers take an flock on <shard>.lock, so the tray, the widget and the
+NLU daemon can share one directory.  Readers notice another process's
+changes through the keys file's size and mtime.
+
+Only numpy and the Python standard library are used.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:         # non-POSIX: in-process locking only
+    fcntl = None
+
+VECTOR_DIR = Path.home() / ".aios" / "vectors"
+
+_DTYPE = np.float16
+
+
+class _Shard(NamedTuple):
+    stamp: tuple                  # (inode, size, mtime_ns) of the keys file
+    dim: int
+    gen: int
+    rows: Dict[str, int]          # live key → row in vectors
+    vectors: np.ndarray           # (n_rows, dim) float16, memory-mapped
+    dead: int                     # rows that are overwritten or tombstoned
+
+
+class ShardedVectorStore:
+    """Named shards of key → float16 vector with append and tombstone delete.
+
+    Args:
+        name: Namespace, typically the encoder id, so different models
+              never share vectors.
+        root: Parent directory of all namespaces.
+    """
+
+    COMPACT_MIN_DEAD = 64   # never compact for fewer dead rows than this
+
+    def __init__(self, name: str, root: Path = VECTOR_DIR) -> None:
+        self.name = name
+        self.dir = Path(root) / re.sub(r"[^A-Za-z0-9_.\-]", "_", name)
+        self._cache: Dict[str, _Shard] = {}
+        self._lock = threading.RLock()
+
+    # ------------------------------------------------------------------
+    # Files
+    # ------------------------------------------------------------------
+
+    def _stem(self, shard: str) -> str:
+        safe = re.sub(r"[^A-Za-z0-9_.\-]", "_", shard)[:48]
+        return f"{safe}-{hashlib.sha1(shard.encode('utf-8')).hexdigest()[:8]}"
+
+    def _keys_path(self, shard: str) -> Path:
+        return self.dir / f"{self._stem(shard)}.keys"
+
+    def _vec_path(self, shard: str, gen: int) -> Path:
+        return self.dir / f"{self._stem(shard)}.{gen}.vec"
+
+    @contextlib.contextmanager
+    def _write_lock(self, shard: str):
+        """Exclusive lock on *shard* against this and other processes."""
+        with self._lock:
+            self.dir.mkdir(parents=True, exist_ok=True)
+            with open(self.dir / f"{self._stem(shard)}.lock", "a") as fh:
+                if fcntl is not None:
+                    fcntl.flock(fh, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    self._cache.pop(shard, None)
+                    if fcntl is not None:
+                        fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _load(self, shard: str) -> Optional[_Shard]:
+        """Current state of *shard*, re-read only if its keys file changed."""
+        path = self._keys_path(shard)
+        for _ in range(3):  # a concurrent compaction may swap files under us
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                return None
+            stamp = (st.st_ino, st.st_size, st.st_mtime_ns)
+            cached = self._cache.get(shard)
+            if cached is not None and cached.stamp == stamp:
+                return cached
+            try:
+                loaded = self._read(shard, path, stamp)
+            except FileNotFoundError:
+                continue
+            self._cache[shard] = loaded
+            return loaded
+        return None
+
+    def _read(self, shard: str, path: Path, stamp: tuple) -> _Shard:
+        rows: Dict[str, int] = {}
+        with open(path, encoding="utf-8") as fh:
+            header = json.loads(fh.readline())
+            for line in fh:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break           # torn final line from an interrupted write
+                if "k" in record:
+                    rows[record["k"]] = record["r"]
+                elif "d" in record:
+                    rows.pop(record["d"], None)
+        dim, gen = int(header["dim"]), int(header["gen"])
+        vec_path = self._vec_path(shard, gen)
+        n_rows = vec_path.stat().st_size // (dim * np.dtype(_DTYPE).itemsize)
+        if n_rows:
+            vectors = np.memmap(vec_path, dtype=_DTYPE, mode="r", shape=(n_rows, dim))
+        else:
+            vectors = np.zeros((0, dim), dtype=_DTYPE)
+        rows = {k: r for k, r in rows.items() if r < n_rows}
+        return _Shard(stamp, dim, gen, rows, vectors, n_rows - len(rows))
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def keys(self, shard: str) -> List[str]:
+        """Live keys of *shard* in row order."""
+        with self._lock:
+            loaded = self._load(shard)
+        if loaded is None:
+            return []
+        return sorted(loaded.rows, key=loaded.rows.get)
+
+    def __contains__(self, shard: str) -> bool:
+        with self._lock:
+            loaded = self._load(shard)
+        return loaded is not None and bool(loaded.rows)
+
+    def get(self, shard: str, keys: List[str]) -> np.ndarray:
+        """Return the float16 rows for *keys* (KeyError if one is missing).
+
+        Keys stored together in one append come back as a slice of the
+        memory map rather than a copy.
+        """
+        with self._lock:
+            loaded = self._load(shard)
+        if loaded is None:
+            if keys:
+                raise KeyError(keys[0])
+            return np.zeros((0, 0), dtype=_DTYPE)
+        idx = np.fromiter((loaded.rows[k] for k in keys), dtype=np.int64, count=len(keys))
+        if len(idx) and np.array_equal(idx, np.arange(idx[0], idx[0] + len(idx))):
+            return loaded.vectors[idx[0]:idx[0] + len(idx)]
+        return np.asarray(loaded.vectors[idx])
+
+    def append(self, shard: str, keys: List[str], vectors: np.ndarray) -> None:
+        """Add rows; a key that is already live is replaced."""
+        vectors = np.ascontiguousarray(np.atleast_2d(vectors), dtype=_DTYPE)
+        if len(keys) != len(vectors):
+            raise ValueError(f"{len(keys)} keys for {len(vectors)} vectors")
+        if not keys:
+            return
+        with self._write_lock(shard):
+            loaded = self._load(shard)
+            if loaded is None:
+                loaded = self._create(shard, vectors.shape[1])
+            if vectors.shape[1] != loaded.dim:
+                raise ValueError(f"shard {shard!r} holds {loaded.dim}-d vectors, "
+                                 f"got {vectors.shape[1]}-d")
+            vec_path = self._vec_path(shard, loaded.gen)
+            with open(vec_path, "ab") as fh:
+                start = fh.tell() // (loaded.dim * vectors.itemsize)
+                fh.write(vectors.tobytes())
+            with open(self._keys_path(shard), "a", encoding="utf-8") as fh:
+                fh.write("".join(json.dumps({"k": k, "r": start + i}) + "\n"
+                                 for i, k in enumerate(keys)))
+
+    def delete(self, shard: str, keys: Iterable[str]) -> int:
+        """Tombstone *keys*; returns how many were live."""
+        with self._write_lock(shard):
+            loaded = self._load(shard)
+            if loaded is None:
+                return 0
+            live = [k for k in dict.fromkeys(keys) if k in loaded.rows]
+            if live:
+                with open(self._keys_path(shard), "a", encoding="utf-8") as fh:
+                    fh.write("".join(json.dumps({"d": k}) + "\n" for k in live))
+                self._cache.pop(shard, None)
+                loaded = self._load(shard)
+                if loaded.dead >= max(self.COMPACT_MIN_DEAD, len(loaded.rows)):
+                    self._compact(shard, loaded)
+        return len(live)
+
+    def drop(self, shard: str) -> bool:
+        """Delete *shard* and its files; returns True if it existed."""
+        with self._write_lock(shard):
+            loaded = self._load(shard)
+            if loaded is None:
+                return False
+            for path in (self._keys_path(shard), self._vec_path(shard, loaded.gen)):
+                with contextlib.suppress(FileNotFoundError):
+                    path.unlink()
+        return True
+
+    def get_or_encode(self, shards: Dict[str, List[str]],
+                      encode_fn: Callable[[List[str]], np.ndarray],
+                      retain: bool = True) -> Dict[str, np.ndarray]:
+        """Return {shard: float16 rows for its phrases}, encoding what is missing.
+
+        The phrases missing from every shard are encoded in one call.
+        With *retain*, each shard's other keys are tombstoned, so a shard
+        tracks its current phrase list.
+        """
+        missing = {}
+        for shard, phrases in shards.items():
+            with self._lock:
+                loaded = self._load(shard)
+            known = loaded.rows if loaded is not None else {}
+            todo = [p for p in dict.fromkeys(phrases) if p not in known]
+            if todo:
+                missing[shard] = todo
+
+        flat = [p for todo in missing.values() for p in todo]
+        if flat:
+            new_vecs = np.asarray(encode_fn(flat), dtype=np.float32)
+            start = 0
+            for shard, todo in missing.items():
+                self.append(shard, todo, new_vecs[start:start + len(todo)])
+                start += len(todo)
+
+        out = {}
+        for shard, phrases in shards.items():
+            if retain:
+                stale = set(self.keys(shard)) - set(phrases)
+                if stale:
+                    self.delete(shard, stale)
+            out[shard] = self.get(shard, list(phrases))
+        return out
+
+    # ------------------------------------------------------------------
+    # Internal writers (caller holds the shard's write lock)
+    # ------------------------------------------------------------------
+
+    def _create(self, shard: str, dim: int, gen: int = 0) -> _Shard:
+        header = json.dumps({"shard": shard, "dim": dim, "gen": gen}) + "\n"
+        self._vec_path(shard, gen).touch()
+        self._keys_path(shard).write_text(header, encoding="utf-8")
+        return self._load(shard)
+
+    def _compact(self, shard: str, loaded: _Shard) -> None:
+        """Rewrite the live rows under a new generation."""
+        keys = sorted(loaded.rows, key=loaded.rows.get)
+        vectors = np.asarray(loaded.vectors[[loaded.rows[k] for k in keys]], dtype=_DTYPE)
+        gen = loaded.gen + 1
+        with open(self._vec_path(shard, gen), "wb") as fh:
+            fh.write(np.ascontiguousarray(vectors).tobytes())
+        tmp = self._keys_path(shard).with_suffix(".keys.tmp")
+        with open(tmp, "w", encoding="utf-8") as fh:
+            fh.write(json.dumps({"shard": shard, "dim": loaded.dim, "gen": gen}) + "\n")
+            fh.write("".join(json.dumps({"k": k, "r": i}) + "\n" for i, k in enumerate(keys)))
+        # The keys file names the generation, so readers switch atomically.
+        os.replace(tmp, self._keys_path(shard))
+        with contextlib.suppress(FileNotFoundError):
+            self._vec_path(shard, loaded.gen).unlink()
+
+    def stats(self, shard: str) -> dict:
+        """Live and dead row counts of *shard*."""
+        with self._lock:
+            loaded = self._load(shard)
+        if loaded is None:
+            return {"live": 0, "dead": 0, "gen": None}
+        return {"live": len(loaded.rows), "dead": loaded.dead, "gen": loaded.gen}
+
+
+# ----------------------------------------------------------------------
+# Demo  (required by project rules: every module must expose run_demo())
+# ----------------------------------------------------------------------
+
+def _fake_encode(phrases: List[str]) -> np.ndarray:
+    """Deterministic 8-d stand-in for SentenceTransformer.encode."""
+    rows = []
+    for p in phrases:
+        seed = int(hashlib.md5(p.encode("utf-8")).hexdigest()[:8], 16)
+        v = np.random.default_rng(seed).standard_normal(8).astype(np.float32)
+        rows.append(v / np.linalg.norm(v))
+    return np.stack(rows)
+
+
+def run_demo() -> None:
+    """Append, replace and delete rows in two shards."""
+    import tempfile
+
+    print("=== Sharded Vector Store Demo ===\n")
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ShardedVectorStore("demo-model", root=Path(tmp))
+        rows = store.get_or_encode({
+            "ORGANIZE_DOWNLOADS": ["clean my downloads", "organize downloads folder"],
+            "SAVED:backup": ["back up my notes", "copy notes to the drive"],
+        }, _fake_encode)
+        for shard, vecs in rows.items():
+            print(f"{shard:<20} {vecs.shape} {vecs.dtype}  memmap={isinstance(vecs, np.memmap)}")
+
+        store.get_or_encode({"SAVED:backup": ["back up my notes"]}, _fake_encode)
+        print(f"\nAfter editing SAVED:backup: {store.stats('SAVED:backup')}")
+        for path in sorted(store.dir.iterdir()):
+            print(f"  {path.name:<40} {path.stat().st_size:>5} bytes")
+    print("\n=== Demo complete ===")
+
+
+# ----------------------------------------------------------------------
+# Tests
+# ----------------------------------------------------------------------
+
+def _run_tests() -> None:
+    """Self-contained test cases for ShardedVectorStore."""
+    import tempfile
+
+    print("\n=== Running Tests ===\n")
+
+    def _must_not_encode(batch):
+        raise AssertionError(f"unexpected encode of {batch}")
+
+    # Test 1: rows persist as float16 and are served without encoding
+    print("Test 1: vectors persist across instances")
+    with tempfile.TemporaryDirectory() as tmp:
+        first = ShardedVectorStore("m", root=Path(tmp)).get_or_encode(
+            {"a": ["x", "y"], "b": ["z"]}, _fake_encode)
+        again = ShardedVectorStore("m", root=Path(tmp)).get_or_encode(
+            {"a": ["y", "x"], "b": ["z"]}, _must_not_encode)
+        assert again["a"].dtype == np.float16
+        assert np.allclose(again["a"], first["a"][::-1])
+        assert np.allclose(again["b"], _fake_encode(["z"]), atol=1e-3)
+    print("  PASSED\n")
+
+    # Test 2: tombstones hide rows, replacing a key keeps the newest row
+    print("Test 2: delete and replace")
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ShardedVectorStore("m", root=Path(tmp))
+        store.append("s", ["x", "y"], _fake_encode(["x", "y"]))
+        assert store.delete("s", ["x", "missing"]) == 1
+        store.append("s", ["y"], np.zeros((1, 8)))
+        reopened = ShardedVectorStore("m", root=Path(tmp))
+        assert reopened.keys("s") == ["y"]
+        assert not reopened.get("s", ["y"]).any()
+        assert reopened.stats("s") == {"live": 1, "dead": 2, "gen": 0}
+    print("  PASSED\n")
+
+    # Test 3: compaction rewrites live rows under a new generation
+    print("Test 3: compaction")
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ShardedVectorStore("m", root=Path(tmp))
+        store.COMPACT_MIN_DEAD = 2
+        phrases = [f"p{i}" for i in range(6)]
+        store.append("s", phrases, _fake_encode(phrases))
+        store.delete("s", phrases[:4])
+        assert store.stats("s") == {"live": 2, "dead": 0, "gen": 1}
+        assert np.allclose(store.get("s", phrases[4:]), _fake_encode(phrases[4:]), atol=1e-3)
+        assert len(list(store.dir.glob("*.vec"))) == 1
+    print("  PASSED\n")
+
+    # Test 4: changes by another instance (process) are picked up
+    print("Test 4: readers see other writers' appends and drops")
+    with tempfile.TemporaryDirectory() as tmp:
+        reader = ShardedVectorStore("m", root=Path(tmp))
+        writer = ShardedVectorStore("m", root=Path(tmp))
+        writer.append("s", ["x"], _fake_encode(["x"]))
+        assert reader.keys("s") == ["x"]
+        writer.append("s", ["y"], _fake_encode(["y"]))
+        assert reader.keys("s") == ["x", "y"]
+        assert writer.drop("s") and "s" not in reader
+    print("  PASSED\n")
+
+    print("=== All Tests Passed ===")
+
+
+if __name__ == "__main__":
+    run_demo()
+    _run_tests()
@@ -8,6 +8,7 @@ Database file: session_memory.db (project root).
 
 import sqlite3
 import os
+import threading
 from datetime import datetime, timedelta
 
 DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "session_memory.db")
@@ -15,113 +16,228 @@ DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "session_memo
 ALLOWED_EXECUTION_STATUSES = {"complete", "interrupted", "failed"}
 
 
+# ----------------------------------------------------------------------
+# Schema migrations
+# ----------------------------------------------------------------------
+
+# _MIGRATIONS[i] brings a database from user_version i to i + 1.  Append
+# new steps; never edit a released one.  Step 1 uses IF NOT EXISTS because
+# databases created before versioning sit at user_version 0 with the
+# tables already present.
+_MIGRATIONS: list[list[str]] = [
+    [
+        """
+        CREATE TABLE IF NOT EXISTS session_memory (
+            id                      INTEGER PRIMARY KEY AUTOINCREMENT,
+            ctr_json                TEXT    NOT NULL,
+            timestamp               TEXT    NOT NULL,
+            execution_status        TEXT    NOT NULL
+                                        CHECK(execution_status IN ('complete', 'interrupted', 'failed')),
+            natural_language_summary TEXT   NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS corrections (
+            id                INTEGER PRIMARY KEY AUTOINCREMENT,
+            command_embedding BLOB    NOT NULL,
+            correct_intent    TEXT    NOT NULL,
+            timestamp         TEXT    NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS checkpoints (
+            id              INTEGER PRIMARY KEY AUTOINCREMENT,
+            checkpoint_json TEXT    NOT NULL,
+            command_text    TEXT    NOT NULL,
+            timestamp       TEXT    NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS user_commands (
+            id           INTEGER PRIMARY KEY AUTOINCREMENT,
+            command_name TEXT    NOT NULL UNIQUE,
+            ctr_json     TEXT    NOT NULL,
+            created_at   TEXT    NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS performance_log (
+            id               INTEGER PRIMARY KEY AUTOINCREMENT,
+            feature_name     TEXT    NOT NULL,
+            estimated_seconds REAL,
+            actual_seconds   REAL,
+            file_count       INTEGER,
+            step_count       INTEGER,
+            timestamp        TEXT    NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS user_preferences (
+            key        TEXT PRIMARY KEY,
+            value      TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS command_paraphrases (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            command_name TEXT NOT NULL,
+            phrase TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS user_profile (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS contacts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            email TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS intent_prototypes (
+            intent_name TEXT    PRIMARY KEY,
+            count       INTEGER NOT NULL,
+            sum_vector  BLOB    NOT NULL,
+            updated_at  TEXT    NOT NULL
+        )
+        """,
+    ],
+    [
+        """
+        CREATE TABLE IF NOT EXISTS llm_plan_cache (
+            request_key TEXT    PRIMARY KEY,
+            plan_json   TEXT    NOT NULL,
+            model       TEXT    NOT NULL,
+            created_at  TEXT    NOT NULL
+        )
+        """,
+    ],
+]
+SCHEMA_VERSION = len(_MIGRATIONS)
+
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    """Apply every migration newer than the database's user_version.
+
+    Each step and its version bump commit together; SQLite DDL is
+    transactional, so a failed step leaves the database at the last
+    complete version.  The version is read under the write lock, so two
+    processes starting at once do not apply a step twice.
+    """
+    while conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < SCHEMA_VERSION:
+                for stmt in _MIGRATIONS[version]:
+                    conn.execute(stmt)
+                conn.execute(f"PRAGMA user_version = {version + 1}")
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+
+# ----------------------------------------------------------------------
+# Connection pool
+# ----------------------------------------------------------------------
+
+# One connection per (thread, database file), opened on first use and kept
+# for the life of the thread.  sqlite3 connections may not cross threads,
+# so pinning them to a thread needs no locking.
+_LOCAL = threading.local()
+_SCHEMA_LOCK = threading.Lock()
+_SCHEMA_READY: set[str] = set()
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, timeout=5.0)
+    conn.row_factory = sqlite3.Row  # rows accessible by column name
+    if db_path != ":memory:":
+        # WAL lets the daemon, tray and CLI read while one of them writes.
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+    return conn
+
+
+def _thread_connection(db_path: str) -> sqlite3.Connection:
+    """Return this thread's connection to *db_path*, opening it if needed."""
+    pool = getattr(_LOCAL, "connections", None)
+    if pool is None:
+        pool = _LOCAL.connections = {}
+    key = os.path.abspath(db_path)
+    conn = pool.get(key)
+    if conn is None:
+        conn = pool[key] = _connect(db_path)
+    return conn
+
+
+def _ensure_schema(db_path: str) -> None:
+    """Run the migrations for *db_path* once per process."""
+    key = os.path.abspath(db_path)
+    if key in _SCHEMA_READY:
+        return
+    with _SCHEMA_LOCK:
+        if key not in _SCHEMA_READY:
+            _migrate(_thread_connection(db_path))
+            _SCHEMA_READY.add(key)
+
+
+def prewarm(db_path: str = DB_PATH) -> None:
+    """Migrate *db_path* and open the calling thread's connection ahead of use."""
+    _ensure_schema(db_path)
+    _thread_connection(db_path)
+
+
 class SQLiteManager:
     """Manages all SQLite interactions for the AI Cognitive OS project.
 
-    Tables created on instantiation (if they do not already exist):
+    Tables (created by the schema migrations below, once per process and
+    database file):
     - session_memory
     - corrections
     - checkpoints
     - user_commands
     - performance_log
+    - user_preferences
+    - command_paraphrases
+    - user_profile
+    - contacts
+    - intent_prototypes
+    - llm_plan_cache
     """
 
     def __init__(self, db_path: str = DB_PATH) -> None:
         self.db_path = db_path
-        self._conn: sqlite3.Connection = sqlite3.connect(self.db_path)
-        self._conn.row_factory = sqlite3.Row  # rows accessible by column name
-        self._create_tables()
+        # An in-memory database lives and dies with its connection, so each
+        # manager gets a private one.  File databases share the pooled
+        # connection of whichever thread is using the manager.
+        self._own_conn: sqlite3.Connection | None = None
+        if db_path == ":memory:":
+            self._own_conn = _connect(db_path)
+            _migrate(self._own_conn)
+        else:
+            _ensure_schema(db_path)
 
     # ------------------------------------------------------------------
     # Internal helpers
     # ------------------------------------------------------------------
 
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        return self._own_conn or _thread_connection(self.db_path)
+
     def _cursor(self) -> sqlite3.Cursor:
         return self._conn.cursor()
 
-    def _create_tables(self) -> None:
-        ddl_statements = [
-            """
-            CREATE TABLE IF NOT EXISTS session_memory (
-                id                      INTEGER PRIMARY KEY AUTOINCREMENT,
-                ctr_json                TEXT    NOT NULL,
-                timestamp               TEXT    NOT NULL,
-                execution_status        TEXT    NOT NULL
-                                            CHECK(execution_status IN ('complete', 'interrupted', 'failed')),
-                natural_language_summary TEXT   NOT NULL
-            )
-            """,
-            """
-            CREATE TABLE IF NOT EXISTS corrections (
-                id                INTEGER PRIMARY KEY AUTOINCREMENT,
-                command_embedding BLOB    NOT NULL,
-                correct_intent    TEXT    NOT NULL,
-                timestamp         TEXT    NOT NULL
-            )
-            """,
-            """
-            CREATE TABLE IF NOT EXISTS checkpoints (
-                id              INTEGER PRIMARY KEY AUTOINCREMENT,
-                checkpoint_json TEXT    NOT NULL,
-                command_text    TEXT    NOT NULL,
-                timestamp       TEXT    NOT NULL
-            )
-            """,
-            """
-            CREATE TABLE IF NOT EXISTS user_commands (
-                id           INTEGER PRIMARY KEY AUTOINCREMENT,
-                command_name TEXT    NOT NULL UNIQUE,
-                ctr_json     TEXT    NOT NULL,
-                created_at   TEXT    NOT NULL
-            )
-            """,
-            """
-            CREATE TABLE IF NOT EXISTS performance_log (
-                id               INTEGER PRIMARY KEY AUTOINCREMENT,
-                feature_name     TEXT    NOT NULL,
-                estimated_seconds REAL,
-                actual_seconds   REAL,
-                file_count       INTEGER,
-                step_count       INTEGER,
-                timestamp        TEXT    NOT NULL
-            )
-            """,
-            """
-            CREATE TABLE IF NOT EXISTS user_preferences (
-                key        TEXT PRIMARY KEY,
-                value      TEXT NOT NULL,
-                updated_at TEXT NOT NULL
-            )
-            """,
-            """
-            CREATE TABLE IF NOT EXISTS command_paraphrases (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                command_name TEXT NOT NULL,
-                phrase TEXT NOT NULL,
-                created_at TEXT NOT NULL
-            )
-            """,
-            """
-            CREATE TABLE IF NOT EXISTS user_profile (
-                key TEXT PRIMARY KEY,
-                value TEXT NOT NULL,
-                updated_at TEXT NOT NULL
-            )
-            """,
-            """
-            CREATE TABLE IF NOT EXISTS contacts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                email TEXT NOT NULL,
-                created_at TEXT NOT NULL
-            )
-            """,
-        ]
-        cursor = self._cursor()
-        for stmt in ddl_statements:
-            cursor.execute(stmt)
-        self._conn.commit()
-
     @staticmethod
     def _now_iso() -> str:
         """Return the current UTC time as an ISO 8601 string."""
@@ -204,6 +320,53 @@ class SQLiteManager:
         rows = cursor.fetchall()
         return [{"id": r[0], "command_name": r[1], "created_at": r[2]} for r in rows]
 
+    def save_user_command(self, command_name: str, ctr_json: str,
+                          phrases: list[str]) -> int:
+        """Insert a *user_commands* row and its first phrases in one transaction.
+
+        Raises sqlite3.IntegrityError if *command_name* already exists.
+        Returns the command id.
+        """
+        now = self._now_iso()
+        with self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO user_commands (command_name, ctr_json, created_at) "
+                "VALUES (?, ?, ?)",
+                (command_name, ctr_json, now),
+            )
+            self._conn.executemany(
+                "INSERT INTO command_paraphrases (command_name, phrase, created_at) "
+                "VALUES (?, ?, ?)",
+                [(command_name, phrase, now) for phrase in dict.fromkeys(phrases)],
+            )
+        return cursor.lastrowid
+
+    def add_command_paraphrases(self, command_name: str, phrases: list[str]) -> list[str]:
+        """Add new *phrases* for a saved command in one transaction.
+
+        Phrases already stored are skipped, and nothing is written if the
+        command has been deleted meanwhile.  Returns every stored phrase
+        for the command, oldest first ([] if it no longer exists).
+        """
+        now = self._now_iso()
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO command_paraphrases (command_name, phrase, created_at) "
+                "SELECT ?, ?, ? WHERE EXISTS "
+                "(SELECT 1 FROM user_commands WHERE command_name = ?) "
+                "AND NOT EXISTS (SELECT 1 FROM command_paraphrases "
+                "WHERE command_name = ? AND phrase = ?)",
+                [(command_name, phrase, now, command_name, command_name, phrase)
+                 for phrase in dict.fromkeys(phrases)],
+            )
+            rows = self._conn.execute(
+                "SELECT phrase FROM command_paraphrases WHERE command_name = ? "
+                "AND EXISTS (SELECT 1 FROM user_commands WHERE command_name = ?) "
+                "ORDER BY id",
+                (command_name, command_name),
+            ).fetchall()
+        return [row["phrase"] for row in rows]
+
     def fetch_recent(self, table_name: str, hours: int = 24) -> list[dict]:
         """Return rows from *table_name* whose timestamp column is within the
         last *hours* hours (UTC).
@@ -238,6 +401,70 @@ class SQLiteManager:
         row = cursor.fetchone()
         return row["value"] if row else default
 
+    def count_rows(self, table_name: str) -> int:
+        """Return the number of rows in *table_name*."""
+        cursor = self._cursor()
+        cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
+        return cursor.fetchone()[0]
+
+    def record_correction(self, command_embedding: bytes, correct_intent: str,
+                          prototype_count: int, prototype_sum: bytes) -> int:
+        """Insert a correction and upsert its intent's running-mean row.
+
+        Both writes share one transaction, so the prototype table never
+        counts a correction that was not stored.  Returns the correction id.
+        """
+        now = self._now_iso()
+        with self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO corrections (command_embedding, correct_intent, timestamp) "
+                "VALUES (?, ?, ?)",
+                (command_embedding, correct_intent, now),
+            )
+            self._conn.execute(
+                "INSERT INTO intent_prototypes (intent_name, count, sum_vector, updated_at) "
+                "VALUES (?, ?, ?, ?) ON CONFLICT(intent_name) DO UPDATE SET "
+                "count = excluded.count, sum_vector = excluded.sum_vector, "
+                "updated_at = excluded.updated_at",
+                (correct_intent, prototype_count, prototype_sum, now),
+            )
+        return cursor.lastrowid
+
+    def replace_prototypes(self, rows: list[tuple]) -> None:
+        """Overwrite *intent_prototypes* with (intent_name, count, sum_vector) rows."""
+        now = self._now_iso()
+        with self._conn:
+            self._conn.execute("DELETE FROM intent_prototypes")
+            self._conn.executemany(
+                "INSERT INTO intent_prototypes (intent_name, count, sum_vector, updated_at) "
+                "VALUES (?, ?, ?, ?)",
+                [(name, count, blob, now) for name, count, blob in rows],
+            )
+
+    def get_cached_plan(self, request_key: str, max_age_hours: float) -> str | None:
+        """Return the cached plan JSON for *request_key* if younger than
+        *max_age_hours*, else None."""
+        cutoff = (datetime.utcnow() - timedelta(hours=max_age_hours)).isoformat()
+        cursor = self._cursor()
+        cursor.execute(
+            "SELECT plan_json FROM llm_plan_cache WHERE request_key = ? AND created_at >= ?",
+            (request_key, cutoff),
+        )
+        row = cursor.fetchone()
+        return row["plan_json"] if row else None
+
+    def put_cached_plan(self, request_key: str, plan_json: str, model: str) -> None:
+        """Upsert a generated plan in the *llm_plan_cache* table."""
+        sql = (
+            "INSERT INTO llm_plan_cache (request_key, plan_json, model, created_at) "
+            "VALUES (?, ?, ?, ?) ON CONFLICT(request_key) DO UPDATE SET "
+            "plan_json = excluded.plan_json, model = excluded.model, "
+            "created_at = excluded.created_at"
+        )
+        cursor = self._cursor()
+        cursor.execute(sql, (request_key, plan_json, model, self._now_iso()))
+        self._conn.commit()
+
     def get_profile(self, key: str) -> str or None:
         conn = self._conn
         cursor = conn.execute(
@@ -269,8 +496,14 @@ class SQLiteManager:
         return row[0] if row else None
 
     def close(self) -> None:
-        """Close the underlying database connection."""
-        self._conn.close()
+        """Release the connection.
+
+        Only an in-memory manager's private connection is closed.  A pooled
+        connection is shared by every manager on this thread and is left
+        untouched, including any transaction another manager has open.
+        """
+        if self._own_conn is not None:
+            self._own_conn.close()
 
     def __enter__(self):
         return self
@@ -361,7 +594,7 @@ def run_demo() -> None:
 # ----------------------------------------------------------------------
 
 def _run_tests() -> None:
-    """Three self-contained test cases for SQLiteManager."""
+    """Self-contained test cases for SQLiteManager."""
     import json
 
     print("\n=== Running Tests ===\n")
@@ -410,6 +643,78 @@ def _run_tests() -> None:
             assert "unknown_status" in str(exc)
     print("  PASSED\n")
 
+    # Test 4: record_correction keeps corrections and prototypes in step
+    print("Test 4: record_correction writes both tables")
+    with SQLiteManager(db_path=":memory:") as db:
+        db.record_correction(b"\x00" * 8, "BULK_RENAME", 1, b"\x01" * 8)
+        db.record_correction(b"\x00" * 8, "BULK_RENAME", 2, b"\x02" * 8)
+        assert db.count_rows("corrections") == 2
+        protos = db.fetch_all("intent_prototypes")
+        assert len(protos) == 1 and protos[0]["count"] == 2
+        assert protos[0]["sum_vector"] == b"\x02" * 8
+    print("  PASSED\n")
+
+    # Test 5: plan cache upserts and honours its age limit
+    print("Test 5: llm_plan_cache put/get")
+    with SQLiteManager(db_path=":memory:") as db:
+        db.put_cached_plan("k", '{"v": 1}', "model-a")
+        db.put_cached_plan("k", '{"v": 2}', "model-b")
+        assert db.get_cached_plan("k", max_age_hours=1) == '{"v": 2}'
+        assert db.get_cached_plan("k", max_age_hours=0) is None
+        assert db.get_cached_plan("missing", max_age_hours=1) is None
+        assert db.count_rows("llm_plan_cache") == 1
+    print("  PASSED\n")
+
+    # Test 6: saved commands and their phrases
+    print("Test 6: save_user_command & add_command_paraphrases")
+    with SQLiteManager(db_path=":memory:") as db:
+        db.save_user_command("check disk", "{}", ["check disk"])
+        try:
+            db.save_user_command("check disk", "{}", ["other"])
+            assert False, "Expected IntegrityError was not raised"
+        except sqlite3.IntegrityError:
+            pass
+        assert db.count_rows("command_paraphrases") == 1
+        phrases = db.add_command_paraphrases("check disk", ["disk usage", "check disk"])
+        assert phrases == ["check disk", "disk usage"], phrases
+        db.delete_where("user_commands", "command_name", "check disk")
+        assert db.add_command_paraphrases("check disk", ["late phrase"]) == []
+        assert db.count_rows("command_paraphrases") == 2
+    print("  PASSED\n")
+
+    # Test 7: file databases are migrated once and share a per-thread connection
+    print("Test 7: pooled connections & versioned schema")
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "pool.db")
+        legacy = sqlite3.connect(path)   # a pre-versioning database
+        legacy.execute(_MIGRATIONS[0][3])
+        legacy.execute("INSERT INTO user_commands (command_name, ctr_json, created_at) "
+                       "VALUES ('old', '{}', 'then')")
+        legacy.commit()
+        legacy.close()
+
+        with SQLiteManager(db_path=path) as a, SQLiteManager(db_path=path) as b:
+            assert a._conn is b._conn
+            assert a._conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+            assert [r["command_name"] for r in a.fetch_all("user_commands")] == ["old"]
+            a.set_preference("k", "v")
+        assert SQLiteManager(db_path=path).get_preference("k") == "v"
+
+        outer = SQLiteManager(db_path=path)
+        outer._conn.execute("INSERT INTO user_profile (key, value, updated_at) "
+                            "VALUES ('pending', 'x', 'now')")
+        SQLiteManager(db_path=path).close()      # must not roll back outer's write
+        outer._conn.commit()
+        assert outer.get_profile("pending") == "x"
+
+        seen = []
+        worker = threading.Thread(target=lambda: seen.append(SQLiteManager(db_path=path)._conn))
+        worker.start()
+        worker.join()
+        assert seen[0] is not SQLiteManager(db_path=path)._conn
+    print("  PASSED\n")
+
     print("=== All Tests Passed ===")
 
 
@@ -2,8 +2,8 @@ def delete_user_command(command_name: str) -> bool:
     """
     Completely removes a saved user command from all storage.
     Deletes from: user_commands, command_paraphrases.
-    Removes from INTENT_EXAMPLES in memory.
-    Resets _INTENT_EMBEDDINGS to None to force rebuild.
+    Removes the SAVED: intent from the router (examples and
+    live intent matrix) without re-encoding anything else.
     Returns True if command existed and was deleted.
     Returns False if command was not found.
     """
@@ -28,14 +28,12 @@ def delete_user_command(command_name: str) -> bool:
                                        "command_name", 
                                        command_name.lower().strip())
     
-    # Remove from in-memory INTENT_EXAMPLES
+    # Splice out of the in-memory intent examples and matrix
     intent_key = f"SAVED:{command_name.lower().strip()}"
-    if intent_key in router.INTENT_EXAMPLES:
-        del router.INTENT_EXAMPLES[intent_key]
+    if router.remove_intent(intent_key):
         print(f"[DELETE] Removed '{intent_key}' from intent examples.")
-    
-    # Force embedding rebuild
-    router._INTENT_EMBEDDINGS = None
+    from nlu_daemon import notify_remove_intent
+    notify_remove_intent(intent_key)
     
     print(f"[DELETE] ✓ Command '{command_name}' fully removed.")
     print(f"  Deleted {deleted_cmd} command record(s) and {deleted_phrases} phrase(s).")
@@ -1,55 +1,173 @@
-from typing import List, Dict, Optional
+from typing import Dict, Iterable, Iterator, List, Optional
+from itertools import islice
 from pathlib import Path
 import re
 import os
 import json
 import numpy as np
-import pytesseract
 import subprocess
-from pdf2image import convert_from_path
-from PIL import Image
-from sklearn.metrics.pairwise import cosine_similarity
 from core.ctr import CTR, validate_ctr
 from core.policy import check_policy
 from core.logger import log_ctr
-from core.nlu_router import get_model
+from core.nlu_router import encode, ENCODER_ID
+from core.model_provider import encode_documents
+from core.ocr_cache import OCRCache
+from core.ocr_pool import ocr_files, ocr_unit, page_count
+from core.doc_index import DocumentIndex, normalize, top_k
 from core.session_context import update_context
 
-def ocr_image(file_path):
-    if file_path.suffix.lower() == ".pdf":
-        pages = convert_from_path(file_path)
-        text = ""
-        for page in pages:
-            text += pytesseract.image_to_string(page)
-        return text
-    else:
-        img = Image.open(file_path)
-        return pytesseract.image_to_string(img)
+# Ranked results returned by process_receipts (the CLI shows at most 5).
+RESULT_LIMIT = 10
+DOCUMENT_SUFFIXES = {".txt", ".pdf", ".jpg", ".png"}
+MAX_CONTENT_CHARS = 2000
+EMBED_BATCH = 64
+
+def ocr_image(file_path, max_chars: Optional[int] = None):
+    """OCR a file page by page, stopping once *max_chars* have been read."""
+    pages = page_count(str(file_path))
+    units = [None] if pages is None else range(1, pages + 1)
+    text = ""
+    for page in units:
+        text += ocr_unit(str(file_path), page)
+        if max_chars and len(text) >= max_chars:
+            break
+    return text
+
+
+def scan_documents(root: Path, skip: Iterable[Path] = ()) -> Iterator[Path]:
+    """Yield document files under *root* as the walk finds them.
+
+    An iterative os.scandir walk: no full file list is built, symlinked
+    directories are not followed, and hidden directories and *skip*
+    (e.g. the export folder) are pruned.
+    """
+    skip = {str(Path(p).expanduser().resolve()) for p in skip}
+    stack = [str(root)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if not entry.name.startswith(".") and \
+                                    os.path.realpath(entry.path) not in skip:
+                                stack.append(entry.path)
+                        elif entry.is_file() and \
+                                os.path.splitext(entry.name)[1].lower() in DOCUMENT_SUFFIXES:
+                            yield Path(entry.path)
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+
+
+def _document(file_path: Path, content: str) -> Optional[Dict]:
+    content = content[:MAX_CONTENT_CHARS]
+    if len(content.strip()) <= 10:  # receipts are short, but not that short
+        return None
+    return {"file": file_path.name, "path": str(file_path), "content": content.lower()}
+
+
+def read_indexed_documents(paths: Iterable[Path], ocr_cache: OCRCache,
+                           misses: List[Path]) -> Iterator[Dict]:
+    """Yield documents readable without OCR (text files, OCR cache hits).
+
+    Files that need OCR are appended to *misses* for ocr_documents().
+    """
+    for file_path in paths:
+        try:
+            if file_path.suffix.lower() == ".txt":
+                with open(file_path, encoding="utf-8", errors="replace") as fh:
+                    doc = _document(file_path, fh.read(MAX_CONTENT_CHARS))
+            else:
+                content = ocr_cache.get(file_path)
+                if content is None:
+                    misses.append(file_path)
+                    continue
+                doc = _document(file_path, content)
+        except OSError:
+            continue
+        if doc:
+            yield doc
+
+
+def ocr_documents(paths: Iterable[Path], ocr_cache: OCRCache) -> Iterator[Dict]:
+    """OCR *paths* across a process pool, store the text in *ocr_cache* and
+    yield each document as soon as its last page is done."""
+    # Only the first MAX_CONTENT_CHARS are ranked, so long PDFs stop early.
+    for file_path, content in ocr_files(paths, max_chars=MAX_CONTENT_CHARS):
+        if content is None:
+            continue
+        try:
+            ocr_cache.put(file_path, content)
+        except OSError:
+            continue
+        doc = _document(file_path, content)
+        if doc:
+            yield doc
+
 
+def _batched(items: Iterable, size: int) -> Iterator[List]:
+    it = iter(items)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
 
-def rank_receipts_against_query(files_content, query):
-    """Semantic ranking using embeddings (LLM-style similarity)."""
 
-    texts = [f["content"] for f in files_content]
-    model = get_model()
+class ReceiptRanker:
+    """Scores documents against one query as they arrive, in batches.
 
-    # Create embeddings
-    query_embedding = model.encode([query])
-    doc_embeddings = model.encode(texts)
+    Only each document's score is kept, so memory grows with the number of
+    documents, not with their vectors.
+    """
 
-    # Compute similarity
-    similarities = cosine_similarity(query_embedding, doc_embeddings)[0]
+    def __init__(self, query: str, index: Optional[DocumentIndex] = None) -> None:
+        self.index = index
+        # The query is short and often repeated, so it uses the cached
+        # encode(); documents bypass that LRU (see encode_documents).
+        self.query_embedding = encode([query])[0]
+        self.docs: List[Dict] = []
+        self.keys: List[str] = []
+        self._scores: List[np.ndarray] = []
 
-    ranked = []
-    for i, score in enumerate(similarities):
-        ranked.append({
-            "file": files_content[i]["file"],
-            "path": files_content[i]["path"],
-            "score": float(score),
-            "content": files_content[i]["content"][:200]
-        })
+    def add(self, docs: List[Dict]) -> None:
+        if not docs:
+            return
+        if self.index is not None:
+            vectors = self.index.vectors(docs, encode_documents)
+            self.keys.extend(DocumentIndex.key(d["path"], d["content"]) for d in docs)
+        else:
+            vectors = normalize(encode_documents([d["content"] for d in docs]))
+        self.docs.extend(docs)
+        self._scores.append(vectors @ normalize(self.query_embedding))
 
-    return sorted(ranked, key=lambda x: x["score"], reverse=True)
+    def ranked(self, k: Optional[int] = None) -> List[Dict]:
+        if not self.docs:
+            return []
+        scores = np.concatenate(self._scores)
+        order = top_k(scores, len(scores) if k is None else k)
+        return [{
+            "file": self.docs[i]["file"],
+            "path": self.docs[i]["path"],
+            "score": float(scores[i]),
+            "content": self.docs[i]["content"][:200]
+        } for i in order]
+
+
+def rank_receipts_against_query(files_content, query, index: Optional[DocumentIndex] = None,
+                                k: Optional[int] = None):
+    """Semantic ranking using embeddings (LLM-style similarity).
+
+    With *index*, document vectors come from the persistent per-directory
+    index and only new or edited documents are encoded.  Only the *k*
+    best matches are returned (all when k is None).
+    """
+    ranker = ReceiptRanker(query, index)
+    for batch in _batched(files_content, EMBED_BATCH):
+        ranker.add(batch)
+    return ranker.ranked(k)
 
 def process_receipts(source_dir: str, query: str, export_dir: Optional[str] = None, dry_run: bool = True) -> List[Dict]:
     """AI-powered: OCR → Rank documents by query relevance."""
@@ -66,35 +184,42 @@ def process_receipts(source_dir: str, query: str, export_dir: Optional[str] = No
     export_path = Path(export_dir).expanduser() if export_dir else source_path / "Receipts"
     export_path.mkdir(exist_ok=True)
     
-    # Find ALL documents
-    all_files = list(source_path.rglob("*"))
-    doc_contents = []
-    
-    print(f"[AI-RECEIPTS] Found {len(all_files)} files, searching for '{query}'...")
-    
-    for file_path in all_files[:20]:  # Top 20 files
-        if file_path.is_file() and file_path.suffix in ['.txt', '.pdf', '.jpg', '.png']:
-            try:
-                if file_path.suffix == '.txt':
-                    content = file_path.read_text()
-                else:
-                    content = ocr_image(file_path)[:2000]  # OCR + truncate
-                
-                if len(content.strip()) > 10:  # receipts are short!
-                    doc_contents.append({
-                        "file": file_path.name,
-                        "path": str(file_path),
-                        "content": content.lower()
-                    })
-            except:
-                continue
-    
-    if not doc_contents:
+    print(f"[AI-RECEIPTS] Searching {source_path} for '{query}'...")
+
+    # Stream: walk → text files and OCR-cache hits → embed in batches.
+    # Files needing OCR are held back so indexed results come out first.
+    ocr_cache = OCRCache()
+    index = DocumentIndex(str(source_path), ENCODER_ID)
+    ranker = ReceiptRanker(query.lower(), index)
+    misses: List[Path] = []
+    indexed = read_indexed_documents(scan_documents(source_path, skip=[export_path]),
+                                     ocr_cache, misses)
+    for batch in _batched(indexed, EMBED_BATCH):
+        ranker.add(batch)
+
+    if misses:
+        early = ranker.ranked(3)
+        if early:
+            print(f"[AI-RECEIPTS] Best so far ({len(ranker.docs)} indexed documents): "
+                  + ", ".join(f"{d['file']} ({d['score']:.1%})" for d in early))
+        print(f"[AI-RECEIPTS] Reading {len(misses)} new or changed files...")
+        for batch in _batched(ocr_documents(misses, ocr_cache), EMBED_BATCH):
+            ranker.add(batch)
+
+    # The walk was complete, so rows for files that are gone can go too.
+    index.prune(ranker.keys)
+    stats = ocr_cache.stats()
+    ocr_cache.close()
+    if stats["hits"] or stats["misses"]:
+        print(f"[AI-RECEIPTS] OCR cache: {stats['hits']} reused, {stats['misses']} OCR'd")
+
+    if not ranker.docs:
         print("[AI-RECEIPTS] No meaningful documents found")
         return []
-    
+
     # AI RANKING ↓ MAGIC
-    ranked = rank_receipts_against_query(doc_contents, query.lower())
+    ranked = ranker.ranked(RESULT_LIMIT)
+    print(f"[AI-RECEIPTS] Ranked {len(ranker.docs)} documents.")
 
     if dry_run:
         print(f"[DRY-RUN] Top 3 matches for '{query}':")
@@ -164,32 +164,81 @@ def execute_shell_plan(ctr, dry_run: bool = False) -> bool:
 
 
 def _save_user_command(trigger_phrase: str, ctr, intent_description: str) -> None:
-    """Saves a SHELL_PLAN CTR as a named user command and generates paraphrases for the sentence transformer."""
+    """
+    Saves a SHELL_PLAN CTR as a named user command.  The command and its
+    trigger phrase are written in one transaction; paraphrase generation
+    and encoding run on the router's background worker.
+    """
+    command_name = trigger_phrase.lower().strip()
     db = SQLiteManager()
-
     try:
-        db.insert("user_commands", {
-            "command_name": trigger_phrase.lower().strip(),
-            "ctr_json": ctr.to_json(),
-            "created_at": datetime.utcnow().isoformat()
-        })
+        db.save_user_command(command_name, ctr.to_json(), [trigger_phrase])
     except Exception as e:
         print(f"[SAVE] Error saving command: {e}")
         return
+    finally:
+        db.close()
+
+    from core.nlu_router import run_in_background
+    run_in_background(_learn_command_phrases, command_name, trigger_phrase)
+    print(f"[SAVE] ✓ Command '{trigger_phrase}' saved. Recognition phrases are being generated in the background.")
 
-    print(f"[SAVE] Generating recognition phrases for '{trigger_phrase}'...")
+
+def _learn_command_phrases(command_name: str, trigger_phrase: str) -> None:
+    """Background half of _save_user_command: paraphrase, persist, splice."""
+    intent = f"SAVED:{command_name}"
+    # The trigger phrase alone makes the command recognisable right away.
+    if not _splice_if_saved(command_name, intent, [trigger_phrase]):
+        return   # deleted before this task ran
 
     paraphrases = generate_paraphrases(trigger_phrase)
+    db = SQLiteManager()
+    try:
+        phrases = db.add_command_paraphrases(command_name, paraphrases)
+    finally:
+        db.close()
+    if not phrases:
+        _retract_intent(intent)   # deleted while the paraphrases were being generated
+        return
+    if _splice_if_saved(command_name, intent, phrases):
+        print(f"[SAVE] ✓ '{trigger_phrase}' now recognised from {len(phrases)} phrases, "
+              f"e.g. {phrases[:3]}")
 
-    for phrase in paraphrases:
-        try:
-            db.insert("command_paraphrases", {
-                "command_name": trigger_phrase.lower().strip(),
-                "phrase": phrase,
-                "created_at": datetime.utcnow().isoformat()
-            })
-        except Exception:
-            pass
-
-    print(f"[SAVE] ✓ Command '{trigger_phrase}' saved with {len(paraphrases)} recognition phrases.")
-    print(f"  You can now say: {paraphrases[:3]}")
+
+def _command_exists(command_name: str) -> bool:
+    db = SQLiteManager()
+    try:
+        return bool(db.fetch_where("user_commands", "command_name", command_name))
+    finally:
+        db.close()
+
+
+def _splice_if_saved(command_name: str, intent: str, phrases: list) -> bool:
+    """Splice *phrases* only while the command is still saved; returns whether it is.
+
+    The command is checked again after the splice, so a delete that lands
+    in between does not leave the intent behind.
+    """
+    if not _command_exists(command_name):
+        return False
+    _splice_intent(intent, phrases)
+    if not _command_exists(command_name):
+        _retract_intent(intent)
+        return False
+    return True
+
+
+def _retract_intent(intent: str) -> None:
+    """Remove *intent* from this process's intent index and a running NLU daemon."""
+    from core.nlu_router import remove_intent
+    from nlu_daemon import notify_remove_intent
+    remove_intent(intent)
+    notify_remove_intent(intent)
+
+
+def _splice_intent(intent: str, phrases: list) -> None:
+    """Add *phrases* to this process's intent index and to a running NLU daemon."""
+    from core.nlu_router import add_intent_examples
+    from nlu_daemon import notify_add_intent
+    add_intent_examples(intent, phrases)
+    notify_add_intent(intent, phrases)
@@ -0,0 +1,307 @@
+"""
+AI-OS NLU Daemon
+----------------
+Keeps the embedding model and the intent matrix resident and serves
+route() over a Unix domain socket, so short-lived CLI calls such as
+
+    python -m cli.main nl "organize my downloads"
+
+skip the torch import and model load.  The CLI uses the daemon when its
+socket answers and routes in-process otherwise.
+
+Protocol: one JSON object per line over the socket, one request per
+connection.
+
+    {"op": "ping"}                                   → {"ok": true}
+    {"op": "route", "text": ..., "context": {...}}   → {"ok": true, "ctr": {...}}
+    {"op": "resolve", "id": ..., "answer": "2"}      → {"ok": true, "ctr": {...}}
+    {"op": "encode", "texts": [...]}                 → {"ok": true, "embeddings": [[...]]}
+    {"op": "add_intent", "intent": ..., "phrases": [...]} → {"ok": true}
+    {"op": "remove_intent", "intent": ...}           → {"ok": true, "existed": bool}
+    {"op": "stats"}                                  → {"ok": true, "stats": {...}}
+
+An ambiguous route answers {"ok": false, "ambiguous": {"id", "prompt"}};
+the client asks the user and sends "resolve".  Anything the router
+printed is returned in "output".
+
+Run with:
+    python nlu_daemon.py
+    python nlu_daemon.py --socket /tmp/aios-nlu.sock
+
+Or via CLI:
+    python -m cli.main nlu-daemon
+"""
+
+import io
+import os
+import sys
+import json
+import socket
+import argparse
+import itertools
+import threading
+import contextlib
+import socketserver
+from collections import OrderedDict
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+SOCKET_PATH = os.environ.get(
+    "AIOS_NLU_SOCKET", str(Path.home() / ".aios" / "nlu.sock")
+)
+
+# Nothing below the client section may import the router or the model:
+# the client half of this module runs in every CLI invocation.
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Client
+# ─────────────────────────────────────────────────────────────────────────────
+
+def request(payload: dict, socket_path: str = SOCKET_PATH,
+            timeout: float = 60.0) -> dict | None:
+    """Send one request; returns the reply, or None if no daemon is listening."""
+    if not os.path.exists(socket_path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(0.5)
+        try:
+            sock.connect(socket_path)
+        except OSError:
+            return None
+        sock.settimeout(timeout)
+        sock.sendall(json.dumps(payload).encode("utf-8") + b"\n")
+        with sock.makefile("rb") as reader:
+            line = reader.readline()
+        return json.loads(line) if line else None
+    finally:
+        sock.close()
+
+
+def is_running(socket_path: str = SOCKET_PATH) -> bool:
+    """True if a daemon answers on *socket_path*."""
+    try:
+        reply = request({"op": "ping"}, socket_path, timeout=2.0)
+    except (OSError, ValueError):
+        return False
+    return bool(reply and reply.get("ok"))
+
+
+def _notify(payload: dict) -> None:
+    try:
+        request(payload)
+    except (OSError, ValueError):
+        pass
+
+
+def notify_add_intent(intent: str, phrases: list) -> None:
+    """Tell a running daemon (if any) about new or replaced intent examples."""
+    _notify({"op": "add_intent", "intent": intent, "phrases": list(phrases)})
+
+
+def notify_remove_intent(intent: str) -> None:
+    """Tell a running daemon (if any) that *intent* was deleted or disabled.
+
+    Every path that calls the router's remove_intent() must call this too,
+    or the daemon keeps routing to the removed intent.
+    """
+    _notify({"op": "remove_intent", "intent": intent})
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Server
+# ─────────────────────────────────────────────────────────────────────────────
+
+# route() reads the process-wide session context, so requests are routed
+# one at a time with the client's context applied.
+_ROUTE_LOCK = threading.Lock()
+
+# Ambiguous commands waiting for the user's answer, oldest first.
+_PENDING: "OrderedDict[str, object]" = OrderedDict()
+_PENDING_MAX = 64
+_PENDING_IDS = itertools.count(1)
+
+
+def _apply_context(fields: dict) -> None:
+    from core.session_context import get_context
+    ctx = get_context()
+    ctx.clear()
+    for name, value in (fields or {}).items():
+        if hasattr(ctx, name):
+            setattr(ctx, name, value)
+
+
+class _ThreadStdout:
+    """sys.stdout stand-in that sends each thread's writes where it asked.
+
+    contextlib.redirect_stdout() swaps the process-wide stream, so output
+    from concurrent handlers, the warm-up and the router's background
+    workers would land in whichever client was being routed.  With this
+    installed, only the routing thread's own prints are captured.
+    """
+
+    def __init__(self, default) -> None:
+        self._default = default
+        self._local = threading.local()
+
+    def write(self, text: str) -> int:
+        return (getattr(self._local, "buffer", None) or self._default).write(text)
+
+    def flush(self) -> None:
+        (getattr(self._local, "buffer", None) or self._default).flush()
+
+    def __getattr__(self, name):
+        return getattr(self._default, name)
+
+    @contextlib.contextmanager
+    def capture(self):
+        previous = getattr(self._local, "buffer", None)
+        self._local.buffer = io.StringIO()
+        try:
+            yield self._local.buffer
+        finally:
+            self._local.buffer = previous
+
+
+_STDOUT_LOCK = threading.Lock()
+
+
+def _thread_stdout() -> _ThreadStdout:
+    """Install (once) and return the per-thread stdout."""
+    with _STDOUT_LOCK:
+        if not isinstance(sys.stdout, _ThreadStdout):
+            sys.stdout = _ThreadStdout(sys.stdout)
+        return sys.stdout
+
+
+def _routed(fn) -> dict:
+    """Run a routing call, capturing its console output and errors."""
+    from core.nlu_router import AmbiguousIntent
+
+    try:
+        with _thread_stdout().capture() as output:
+            ctr = fn()
+    except AmbiguousIntent as ambiguity:
+        ambiguity_id = str(next(_PENDING_IDS))
+        _PENDING[ambiguity_id] = ambiguity
+        while len(_PENDING) > _PENDING_MAX:
+            _PENDING.popitem(last=False)
+        return {"ok": False, "output": output.getvalue(),
+                "ambiguous": {"id": ambiguity_id, "prompt": ambiguity.prompt()}}
+    except ValueError as exc:
+        return {"ok": False, "output": output.getvalue(),
+                "error": str(exc), "type": "ValueError"}
+    return {"ok": True, "output": output.getvalue(), "ctr": json.loads(ctr.to_json())}
+
+
+def handle(payload: dict) -> dict:
+    """Dispatch one decoded request."""
+    import core.nlu_router as router
+
+    op = payload.get("op")
+    if op == "ping":
+        return {"ok": True}
+
+    if op == "route":
+        with _ROUTE_LOCK:
+            _apply_context(payload.get("context"))
+            return _routed(lambda: router.route(payload["text"]))
+
+    if op == "resolve":
+        with _ROUTE_LOCK:
+            ambiguity = _PENDING.pop(str(payload.get("id")), None)
+            if ambiguity is None:
+                return {"ok": False, "error": "unknown or expired ambiguity id",
+                        "type": "ValueError"}
+            intent = ambiguity.choose(str(payload.get("answer", "")))
+            return _routed(lambda: router.resolve_ambiguity(ambiguity, intent))
+
+    if op == "encode":
+        vectors = router.encode(list(payload.get("texts", [])))
+        return {"ok": True, "embeddings": vectors.tolist()}
+
+    if op == "add_intent":
+        router.add_intent_examples(payload["intent"], list(payload.get("phrases", [])))
+        return {"ok": True}
+
+    if op == "remove_intent":
+        # Also invalidates the route cache, so no cached CTR outlives it.
+        return {"ok": True, "existed": router.remove_intent(payload["intent"])}
+
+    if op == "stats":
+        from core.model_provider import query_cache_stats, embedding_service_stats
+        return {"ok": True, "stats": {
+            "route_cache": router.route_cache_stats(),
+            "route_paths": router.route_path_stats(),
+            "query_cache": query_cache_stats(),
+            "embedding_service": embedding_service_stats(),
+        }}
+
+    return {"ok": False, "error": f"unknown op: {op!r}", "type": "ValueError"}
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            reply = handle(json.loads(line))
+        except Exception as exc:
+            reply = {"ok": False, "error": str(exc), "type": type(exc).__name__}
+        self.wfile.write(json.dumps(reply).encode("utf-8") + b"\n")
+
+
+class _Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+def run_daemon(socket_path: str = SOCKET_PATH) -> None:
+    """Warm the model and serve requests on *socket_path*. Blocks until Ctrl+C."""
+    if is_running(socket_path):
+        print(f"[NLU-DAEMON] Already running on {socket_path}")
+        return
+    # A socket file nobody answers on is left over from a crash.
+    with contextlib.suppress(FileNotFoundError):
+        os.unlink(socket_path)
+    os.makedirs(os.path.dirname(socket_path) or ".", exist_ok=True)
+
+    from core.model_provider import warm_up
+    from db_manager import prewarm
+    warm_up()
+    prewarm()
+
+    old_umask = os.umask(0o177)   # socket readable by this user only
+    try:
+        server = _Server(socket_path, _Handler)
+    finally:
+        os.umask(old_umask)
+
+    print(f"🧠 AI-OS NLU Daemon started")
+    print(f"   Socket : {socket_path}")
+    print(f"   Ctrl+C to stop.\n")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n[NLU-DAEMON] Daemon stopped.")
+    finally:
+        server.server_close()
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(socket_path)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Entry point (standalone usage)
+# ─────────────────────────────────────────────────────────────────────────────
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="AI-OS NLU Daemon")
+    parser.add_argument(
+        "--socket",
+        default=SOCKET_PATH,
+        help=f"Unix socket path (default: {SOCKET_PATH})",
+    )
+    args = parser.parse_args()
+    run_daemon(args.socket)
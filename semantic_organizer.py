@@ -10,18 +10,17 @@ import json
 import collections
 import re
 import numpy as np
-from sentence_transformers import SentenceTransformer
 from sklearn.cluster import KMeans
 from sklearn.metrics import silhouette_score
 from checkpoint_manager import CheckpointManager
+from core.nlu_router import get_model, encode
 
 
 class SemanticOrganizer:
     
     def __init__(self):
-        # We instantiate the model once; it will download the weights on first run
-        # if they aren't already cached.
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
+        # Share the router's model instance instead of loading a second copy.
+        self.model = get_model()
     
     def _get_file_text(self, filepath: str) -> str:
         """Extract a semantic representation of a file combining its name and top 300 bytes."""
@@ -113,7 +112,7 @@ class SemanticOrganizer:
         texts = [self._get_file_text(fp) for fp in filepaths]
         
         # Embed all texts
-        embeddings = self.model.encode(texts)
+        embeddings = encode(texts)
         
         # Determine optimal K (up to max_k=6)
         k = self._choose_k(embeddings, max_k=6)
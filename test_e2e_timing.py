@@ -117,13 +117,7 @@ def run_pipeline_for(text: str):
 
     # --- Stage 2: Classification (dot-product only, embedding already computed) ---
     def _classify_only():
-        intent_embs = _nlu._INTENT_EMBEDDINGS
-        scores = []
-        for intent, embs in intent_embs.items():
-            s = float(np.max(np.dot(embs, emb)))
-            scores.append((intent, s))
-        scores.sort(key=lambda x: x[1], reverse=True)
-        return scores[0][0], scores[0][1]
+        return _nlu.classify_embeddings(emb[None, :])[0]
 
     (intent, confidence), t_cls = _time_stage(_classify_only)
 
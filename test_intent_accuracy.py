@@ -22,8 +22,6 @@ logging.disable(logging.CRITICAL)
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 import numpy as np
-from datetime import datetime
-from db_manager import SQLiteManager
 import core.nlu_router as _nlu
 
 # ── Force model + embeddings to build now (before we capture timing) ──────────
@@ -90,25 +88,13 @@ assert len(TEST_CASES) == 30, f"Got {len(TEST_CASES)} test cases"
 
 def _classify_batch(texts):
     """
-    Batch-encode all texts in one shot, then compute max dot-product per intent.
+    Classify all texts with the router's batch API: one model.encode() call
+    and one matrix product against the stacked intent matrix.
     Returns list of (predicted_intent, confidence) in same order as texts.
     This is functionally identical to an EOFError-fallback classify_intent()
-    but 30× faster because there is only one model.encode() call.
+    but 30× faster than calling it once per command.
     """
-    # Rebuild embeddings dict in case prototype was updated mid-run
-    intent_embs = _nlu._INTENT_EMBEDDINGS
-
-    query_embs = _model.encode(texts, show_progress_bar=False, batch_size=64)
-
-    results = []
-    for qe in query_embs:
-        scores = []
-        for intent, embs in intent_embs.items():
-            s = float(np.max(np.dot(embs, qe)))
-            scores.append((intent, s))
-        scores.sort(key=lambda x: x[1], reverse=True)
-        results.append((scores[0][0], scores[0][1]))
-    return results
+    return _nlu.classify_intents_batch(texts)
 
 
 def _run_all():
@@ -128,14 +114,6 @@ def _per_intent_breakdown(results):
     return counts
 
 
-def _insert_correction(db, emb, correct_intent):
-    db.insert("corrections", {
-        "command_embedding": emb.astype("float32").tobytes(),
-        "correct_intent":    correct_intent,
-        "timestamp":         datetime.utcnow().isoformat(),
-    })
-
-
 def main():
     # ── STEP 3: Baseline ─────────────────────────────────────────────────────
     baseline_results = _run_all()
@@ -144,8 +122,6 @@ def main():
     baseline_bd      = _per_intent_breakdown(baseline_results)
 
     # ── STEP 4: Build 15 corrections ─────────────────────────────────────────
-    db = SQLiteManager()
-
     wrong_preds = [
         (cmd, predicted, expected)
         for cmd, expected, predicted, _ in baseline_results
@@ -181,17 +157,12 @@ def main():
     for i, ((cmd, wrong_intent, correct_intent), emb) in \
             enumerate(zip(corrections_to_make, corr_embs), 1):
 
-        _insert_correction(db, emb, correct_intent)
+        # Stores the correction; the prototype adapts every 5 per intent
+        count_for_intent = _nlu.record_correction(emb, correct_intent)
         correction_log.append((i, cmd, wrong_intent, correct_intent))
-
-        # Trigger prototype update after every 5 corrections for this intent
-        count_for_intent = len(db.fetch_where("corrections", "correct_intent", correct_intent))
         if count_for_intent >= 5 and (count_for_intent % 5) == 0:
-            _nlu._maybe_update_prototype(correct_intent, emb)
             prototype_count += 1
 
-    db.close()
-
     # ── STEP 5: Adapted run ───────────────────────────────────────────────────
     adapted_results  = _run_all()
     adapted_correct  = sum(1 for _, e, p, _ in adapted_results if e == p)
@@ -0,0 +1,76 @@
+"""
+ui/ambiguity.py
+===============
+"Did you mean…" handling shared by the Tk front-ends (ui.tray_gui and
+ui.desktop_widget).
+
+When route() raises AmbiguousIntent on a worker thread, the front-end
+schedules ask_intent_choice() on the Tk thread.  Picking an intent runs
+the command with resolve_command_bg(); closing the window or pressing
+Cancel calls *on_cancel* so the caller can report it.
+"""
+
+from __future__ import annotations
+
+import threading
+
+try:
+    import tkinter as tk
+    _HAS_TK = True
+except ImportError:
+    _HAS_TK = False
+
+
+# Same palette as the tray palette and the desktop widget
+_BG       = "#0f0f1a"
+_BG_PANEL = "#1e1e2e"
+_ACCENT   = "#a78bfa"
+_FG       = "#e2e8f0"
+_FG_DIM   = "#64748b"
+
+
+def resolve_command_bg(ambiguity, intent: str, on_done: callable) -> None:
+    """Run an ambiguous command with the intent the user picked, in a daemon thread.
+
+    Calls on_done(True, task_type) or on_done(False, error message).
+    """
+    def _run():
+        try:
+            from core.nlu_router import resolve_ambiguity
+            from core.workflow import run_workflow
+            ctr = resolve_ambiguity(ambiguity, intent)
+            run_workflow(ctr, dry_run=False)
+            on_done(True, ctr.task_type)
+        except Exception as exc:
+            on_done(False, str(exc))
+
+    threading.Thread(target=_run, daemon=True).start()
+
+
+def ask_intent_choice(parent: "tk.Misc", ambiguity, on_choice: callable,
+                      on_cancel: callable) -> None:
+    """Non-modal "Did you mean…" window; calls on_choice(intent) or on_cancel() on the Tk thread."""
+    dlg = tk.Toplevel(parent)
+    dlg.title("Did you mean…")
+    dlg.configure(bg=_BG)
+    dlg.resizable(False, False)
+    dlg.attributes("-topmost", True)
+
+    tk.Label(dlg, text=f"“{ambiguity.text}” — did you mean:",
+             fg=_FG, bg=_BG, wraplength=320).pack(padx=12, pady=(10, 6))
+
+    def _pick(intent: str) -> None:
+        dlg.destroy()
+        on_choice(intent)
+
+    def _cancel() -> None:
+        dlg.destroy()
+        on_cancel()
+
+    for intent, score in ambiguity.candidates:
+        tk.Button(dlg, text=f"{intent.replace('_', ' ').title()}  ({score:.2f})",
+                  fg=_FG, bg=_BG_PANEL, activebackground=_ACCENT, relief=tk.FLAT,
+                  command=lambda i=intent: _pick(i)).pack(fill=tk.X, padx=12, pady=2)
+    tk.Button(dlg, text="Cancel", fg=_FG_DIM, bg=_BG, relief=tk.FLAT,
+              command=_cancel).pack(pady=(4, 10))
+    dlg.protocol("WM_DELETE_WINDOW", _cancel)
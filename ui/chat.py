@@ -234,10 +234,10 @@ def _dispatch(text: str) -> dict:
     t0 = time.time()
     try:
         # Lazy import — keeps startup fast
-        from core.nlu_router import route
+        from cli.main import route_with_prompt
         from core.workflow import run_workflow
 
-        ctr = route(text)
+        ctr = route_with_prompt(text)
         entry["intent"] = ctr.task_type
 
         if con:
@@ -285,22 +285,23 @@ def _handle_undo(text: str) -> None:
     else:
         # Semantic undo: find nearest checkpoint by query
         try:
-            from core.nlu_router import get_model
+            from core.nlu_router import encode
             from db_manager import SQLiteManager
             import numpy as np
             query = text[5:].strip() if text.lower().startswith("undo ") else text
-            model = get_model()
-            q_emb = model.encode([query])[0]
             db    = SQLiteManager()
             rows  = db.fetch_all("checkpoints")
             db.close()
             best_id, best_score = None, -1.0
-            for row in rows:
-                c_emb = model.encode([row["command_text"]])[0]
-                score = float(np.dot(q_emb, c_emb) /
-                              max(np.linalg.norm(q_emb) * np.linalg.norm(c_emb), 1e-9))
-                if score > best_score:
-                    best_score, best_id = score, row["id"]
+            if rows:
+                # One cached encode for the query and every checkpoint label
+                embs  = encode([query] + [row["command_text"] for row in rows])
+                q_emb = embs[0]
+                for row, c_emb in zip(rows, embs[1:]):
+                    score = float(np.dot(q_emb, c_emb) /
+                                  max(np.linalg.norm(q_emb) * np.linalg.norm(c_emb), 1e-9))
+                    if score > best_score:
+                        best_score, best_id = score, row["id"]
             if best_id is not None:
                 cm  = CheckpointManager()
                 msg = cm.restore(best_id)
@@ -334,9 +335,9 @@ def _handle_delete_feature(text: str) -> None:
         db.set_preference(f"disabled_feature_{feat}", feat)
         
         import core.nlu_router
-        if feat in core.nlu_router.INTENT_EXAMPLES:
-            del core.nlu_router.INTENT_EXAMPLES[feat]
-            core.nlu_router._INTENT_EMBEDDINGS = None
+        from nlu_daemon import notify_remove_intent
+        core.nlu_router.remove_intent(feat)
+        notify_remove_intent(feat)
             
         _p(f"  [{_C['green']}]✓ Feature '{feat}' successfully disabled.[/]")
     else:
@@ -395,10 +396,9 @@ def _handle_delete_command(text: str) -> None:
     
     # Remove from dynamic NLU routing list so it stops matching immediately
     import core.nlu_router
-    intent_key = f"SAVED:{cmd_name}"
-    if intent_key in core.nlu_router.INTENT_EXAMPLES:
-        del core.nlu_router.INTENT_EXAMPLES[intent_key]
-        core.nlu_router._INTENT_EMBEDDINGS = None
+    from nlu_daemon import notify_remove_intent
+    core.nlu_router.remove_intent(f"SAVED:{cmd_name}")
+    notify_remove_intent(f"SAVED:{cmd_name}")
         
     _p(f"  [{_C['green']}]✓ Saved command '{cmd_name}' successfully deleted.[/]")
 
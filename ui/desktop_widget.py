@@ -63,6 +63,8 @@ except ImportError:
 
 logging.disable(logging.NOTSET)
 
+from ui.ambiguity import ask_intent_choice, resolve_command_bg
+
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # Constants
@@ -160,17 +162,28 @@ def _fetch_recent_commands(limit: int = _MAX_HISTORY) -> list[dict]:
         return []
 
 
-def _send_command_bg(text: str, on_done: callable) -> None:
-    """Process *text* via NLU router in a daemon thread."""
+def _send_command_bg(text: str, on_done: callable,
+                     on_ambiguous: Optional[callable] = None) -> None:
+    """Process *text* via NLU router in a daemon thread.
+
+    An ambiguous command is handed to *on_ambiguous* (if given) instead of
+    blocking the thread; continue it with ui.ambiguity.resolve_command_bg().
+    """
     def _run():
         try:
-            from core.nlu_router import route
+            from core.nlu_router import route, AmbiguousIntent
             from core.workflow import run_workflow
-            ctr = route(text)
+            try:
+                ctr = route(text)
+            except AmbiguousIntent as ambiguity:
+                if on_ambiguous is None:
+                    raise
+                on_ambiguous(ambiguity)
+                return
             run_workflow(ctr, dry_run=False)
-            on_done(True, ctr.task_type.replace("_", " ").title())
+            on_done(True, ctr.task_type)
         except Exception as exc:
-            on_done(False, str(exc)[:80])
+            on_done(False, str(exc))
     threading.Thread(target=_run, daemon=True).start()
 
 
@@ -532,12 +545,22 @@ class DesktopWidget:
 
         def _done(ok: bool, detail: str) -> None:
             if ok:
-                _notify("AI OS Agent", f"✅ {detail}", icon="emblem-default")
+                _notify("AI OS Agent", f"✅ {detail.replace('_', ' ').title()}",
+                        icon="emblem-default")
                 self._mock_data = None   # force DB refresh
             else:
-                _notify("AI OS Agent", f"❌ {detail}", icon="dialog-error")
-
-        _send_command_bg(text, _done)
+                _notify("AI OS Agent", f"❌ {detail[:80]}", icon="dialog-error")
+
+        def _ambiguous(ambiguity) -> None:
+            # Called on the worker thread; the chooser belongs on the Tk thread.
+            self._root.after(0, lambda: ask_intent_choice(
+                self._root, ambiguity,
+                on_choice=lambda intent: resolve_command_bg(ambiguity, intent, _done),
+                on_cancel=lambda: _notify("AI OS Agent", f"Cancelled: {text}",
+                                          icon="dialog-information"),
+            ))
+
+        _send_command_bg(text, _done, on_ambiguous=_ambiguous)
 
     def _do_resume(self) -> None:
         def _run():
@@ -529,6 +529,10 @@ def main(argv: Optional[list[str]] = None) -> None:
         run_demo()
         return
 
+    # ── Start loading the embedding model while the menu is on screen ─────────
+    from core.model_provider import warm_up
+    warm_up()
+
     # ── Probe environment ──────────────────────────────────────────────────────
     caps = detect_capabilities()
 
@@ -60,6 +60,8 @@ except ImportError:
 
 logging.disable(logging.NOTSET)
 
+from ui.ambiguity import ask_intent_choice, resolve_command_bg
+
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # Constants
@@ -112,13 +114,25 @@ def _center_window(win: tk.Toplevel | tk.Tk, w: int, h: int) -> None:
     win.geometry(f"{w}x{h}+{x}+{y}")
 
 
-def _process_command_bg(text: str, on_done: callable) -> None:
-    """Route *text* through NLU + workflow in a daemon thread."""
+def _process_command_bg(text: str, on_done: callable,
+                        on_ambiguous: Optional[callable] = None) -> None:
+    """Route *text* through NLU + workflow in a daemon thread.
+
+    If the router cannot decide between two intents and *on_ambiguous* is
+    given, it receives the AmbiguousIntent and the thread ends; the caller
+    asks the user and continues with ui.ambiguity.resolve_command_bg().
+    """
     def _run():
         try:
-            from core.nlu_router import route
+            from core.nlu_router import route, AmbiguousIntent
             from core.workflow import run_workflow
-            ctr = route(text)
+            try:
+                ctr = route(text)
+            except AmbiguousIntent as ambiguity:
+                if on_ambiguous is None:
+                    raise
+                on_ambiguous(ambiguity)
+                return
             run_workflow(ctr, dry_run=False)
             on_done(True, ctr.task_type)
         except Exception as exc:
@@ -278,7 +292,15 @@ class CommandPalette:
                 self._history.update(entry, "ERROR")
                 _notify(_APP_NAME, f"❌ {detail[:80]}", icon="dialog-error")
 
-        _process_command_bg(text, _done)
+        def _ambiguous(ambiguity) -> None:
+            # Called on the worker thread; the chooser belongs on the Tk thread.
+            self._root.after(0, lambda: ask_intent_choice(
+                self._root, ambiguity,
+                on_choice=lambda intent: resolve_command_bg(ambiguity, intent, _done),
+                on_cancel=lambda: self._history.update(entry, "CANCELLED"),
+            ))
+
+        _process_command_bg(text, _done, on_ambiguous=_ambiguous)
 
     # ── Visibility ────────────────────────────────────────────────────────────
 
@@ -381,6 +403,7 @@ class HistoryWindow:
         self._tree.tag_configure("ERROR",   foreground=_RED)
         self._tree.tag_configure("PENDING", foreground=_YELLOW)
         self._tree.tag_configure("RUNNING", foreground=_ACCENT)
+        self._tree.tag_configure("CANCELLED", foreground=_FG_DIM)
 
         # ── Refresh button ────────────────────────────────────────────────────
         btn_font = tkfont.Font(family="Segoe UI", size=9)
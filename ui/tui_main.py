@@ -69,6 +69,7 @@ class CmdStatus(Enum):
     RUNNING = auto()
     DONE    = auto()
     ERROR   = auto()
+    SKIPPED = auto()
 
 
 _STATUS_STYLE: dict[CmdStatus, tuple[str, str]] = {
@@ -76,6 +77,7 @@ _STATUS_STYLE: dict[CmdStatus, tuple[str, str]] = {
     CmdStatus.RUNNING: ("bold cyan",    "RUNNING"),
     CmdStatus.DONE:    ("bold green",   " DONE  "),
     CmdStatus.ERROR:   ("bold red",     " ERROR "),
+    CmdStatus.SKIPPED: ("dim",          "SKIPPED"),
 }
 
 
@@ -105,6 +107,10 @@ class TUIState:
         self.spinner_active: bool = False
         self._scroll_offset: int = 0   # rows from bottom (0 = newest visible)
         self.status_message: str = ""   # ephemeral status bar override
+        # (AmbiguousIntent, HistoryEntry) waiting for the user to type 1/2;
+        # set by worker threads and taken by the input thread, so only
+        # touched through ask_choice()/take_choice() under _lock
+        self.pending_choice: Optional[tuple] = None
 
     # -- thread-safe mutators --------------------------------------------------
 
@@ -147,6 +153,21 @@ class TUIState:
         with self._lock:
             self._scroll_offset = max(0, self._scroll_offset - 1)
 
+    def ask_choice(self, ambiguity, entry: HistoryEntry) -> Optional[tuple]:
+        """Make *ambiguity* the open question; returns the one it replaces, if any."""
+        with self._lock:
+            previous, self.pending_choice = self.pending_choice, (ambiguity, entry)
+            self.status_message = ambiguity.prompt()
+        return previous
+
+    def take_choice(self) -> Optional[tuple]:
+        """Remove and return the open (ambiguity, entry) question, if any."""
+        with self._lock:
+            pending, self.pending_choice = self.pending_choice, None
+            if pending is not None:
+                self.status_message = ""
+        return pending
+
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # Renderers
@@ -302,29 +323,60 @@ def _process_command(text: str, entry: HistoryEntry, state: TUIState) -> None:
     """Execute *text* through the NLU pipeline; update *entry* on completion."""
     state.update_entry(entry, CmdStatus.RUNNING)
     try:
-        from core.nlu_router import route
-        from core.workflow import run_workflow
-
-        ctr = route(text)
-        intent     = ctr.task_type
-        confidence = 0.0
+        from core.nlu_router import route, last_route_confidence, AmbiguousIntent
 
-        # Re-classify to surface confidence score for the sidebar
         try:
-            from core.nlu_router import classify_intent
-            _, confidence = classify_intent(text)
-        except Exception:
-            pass
-
-        run_workflow(ctr, dry_run=False)
-        state.update_entry(entry, CmdStatus.DONE,
-                           intent=intent, confidence=confidence,
-                           result="OK")
+            ctr = route(text)
+        except AmbiguousIntent as ambiguity:
+            # Don't block this worker: ask in the status bar, answer via 1/2
+            state.update_entry(entry, CmdStatus.PENDING,
+                               result="Ambiguous — type 1 or 2")
+            replaced = state.ask_choice(ambiguity, entry)
+            if replaced is not None:
+                _skip_choice(replaced, state)
+            return
+
+        _run_ctr(ctr, entry, state, last_route_confidence())
     except Exception as exc:
         state.update_entry(entry, CmdStatus.ERROR,
                            result=str(exc))
 
 
+def _run_ctr(ctr, entry: HistoryEntry, state: TUIState,
+             confidence: Optional[float]) -> None:
+    """Execute a routed CTR and record the outcome on *entry*.
+
+    *confidence* is what routing already computed (None for multi-step
+    commands); the command is not classified again for the sidebar.
+    """
+    from core.workflow import run_workflow
+
+    run_workflow(ctr, dry_run=False)
+    state.update_entry(entry, CmdStatus.DONE,
+                       intent=ctr.task_type, confidence=confidence or 0.0,
+                       result="OK")
+
+
+def _resolve_pending(pending: tuple, answer: str, state: TUIState) -> None:
+    """Route the *pending* ambiguous command with the user's choice."""
+    ambiguity, entry = pending
+    state.update_entry(entry, CmdStatus.RUNNING)
+    try:
+        from core.nlu_router import resolve_ambiguity
+        intent = ambiguity.choose(answer)
+        ctr = resolve_ambiguity(ambiguity, intent)
+        _run_ctr(ctr, entry, state, dict(ambiguity.candidates).get(intent))
+    except Exception as exc:
+        state.update_entry(entry, CmdStatus.ERROR, result=str(exc))
+
+
+def _skip_choice(pending: tuple, state: TUIState) -> None:
+    """Mark the entry of an abandoned ambiguity question SKIPPED."""
+    _, entry = pending
+    state.update_entry(entry, CmdStatus.SKIPPED,
+                       result="Ambiguous — skipped, no choice made")
+
+
 def _handle_special(text: str, state: TUIState) -> bool:
     """
     Handle built-in keyboard shortcuts and /mode commands.
@@ -332,6 +384,15 @@ def _handle_special(text: str, state: TUIState) -> bool:
     """
     stripped = text.strip().lower()
 
+    # --- Answer to an ambiguity question; anything else abandons it ---
+    pending = state.take_choice()
+    if pending is not None:
+        if stripped.isdigit():
+            threading.Thread(target=_resolve_pending, args=(pending, stripped, state),
+                             daemon=True).start()
+            return True
+        _skip_choice(pending, state)
+
     # --- Mode switch ---
     if stripped.startswith("/mode"):
         try:
@@ -606,6 +667,18 @@ def run_demo() -> None:
     assert state.last_intent == "ORGANIZE_DOWNLOADS",    "last_intent mismatch"
     assert abs(state.last_confidence - 0.91) < 0.01,    "last_confidence mismatch"
 
+    # --- Typing something other than 1/2 skips a pending question ---------
+    e4 = state.add_entry("sort my stuff")
+    class _Question:
+        def prompt(self):
+            return "Ambiguous command. Enter 1 or 2:"
+
+    state.update_entry(e4, CmdStatus.PENDING, result="Ambiguous — type 1 or 2")
+    assert state.ask_choice(_Question(), e4) is None
+    assert not _handle_special("clean my downloads", state)
+    assert state.take_choice() is None and state.status_message == ""
+    assert e4.status == CmdStatus.SKIPPED,               "Entry 4 should be SKIPPED"
+
     # --- Simulate handle_mode_switch -------------------------------------
     try:
         from ui.launcher import handle_mode_switch
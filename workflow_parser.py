@@ -124,7 +124,7 @@ class WorkflowParser:
 
         Steps:
         1. Split on conjunction tokens.
-        2. For each segment, classify intent via sentence-transformers.
+        2. Classify all segments in one batch via sentence-transformers.
         3. Extract any file-path patterns with regex.
         4. Return list of {executor_type, parameters} dicts.
 
@@ -134,16 +134,18 @@ class WorkflowParser:
         Returns:
             List of step dicts.
         """
-        from core.nlu_router import classify_intent, extract_paths  # lazy import
+        from core.nlu_router import classify_intents_batch, extract_paths  # lazy import
 
         # Split into clauses on conjunctions / commas
         segments = [s.strip() for s in _SPLIT_PATTERN.split(description) if s.strip()]
         if not segments:
             segments = [description.strip()]
 
+        # One encode + one matrix product for every clause
+        intents = classify_intents_batch(segments)
+
         steps: list[dict] = []
-        for segment in segments:
-            intent, _confidence = classify_intent(segment)
+        for segment, (intent, _confidence) in zip(segments, intents):
 
             # Extract paths using the spec-required regex first; fall back to
             # the router's broader extract_paths for anything missed.